@@ -32,13 +32,22 @@ def timer( label ) :
 #
 #
 from .lexer import StarLexer
-from .handlers import ErrorHandler, ContentHandlerBase, ContentHandler, ContentHandler2, SasContentHandler
+from .handlers import ErrorHandler, ContentHandlerBase, ContentHandler, ContentHandler2, SasContentHandler, \
+    RowContentHandler
 from .parsebase import ParserBase
-from .nmrstar import SasParser, SansParser, Parser as SansParser2
-from .mmcif import CifParser
-from .ddl import DdlParser
 #from .quickcheck import QuickCheck
 
+# dialect parsers are imported when first used: ``sas.SansParser`` etc. work as before
+# but programs that only need one parser (or just the lexer) don't pay for the rest.
+#
+_PARSERS = {
+    "SasParser"   : (".nmrstar", "SasParser"),
+    "SansParser"  : (".nmrstar", "SansParser"),
+    "SansParser2" : (".nmrstar", "Parser"),
+    "CifParser"   : (".mmcif", "CifParser"),
+    "DdlParser"   : (".ddl", "DdlParser")
+}
+
 # because of PLY's design I can't easily re-use lexer regexps elsewhere. so here they are again.
 # (use group for warnings: "keyword group(1) in value".)
 #
@@ -52,11 +61,46 @@ KEYWORDS = (
     re.compile( r"(?:^|\s)(_\w[^\s]*)\s*.*$", re.IGNORECASE )
 )
 
+# any of the above: quick check before looking at every line
+#
+_ANY_KEYWORD = re.compile( r"(?:^|\s)(?:global_|data_\w|save_|loop_|stop_|_\w)", re.IGNORECASE )
+
+def find_keywords( text, line ) :
+    """
+    generator: check ``text`` for ``KEYWORDS`` one line at a time
+
+    ``line`` is the line number of the first line in ``text``.
+    Yields (line number, keyword) for every line with a keyword in it (first one found).
+    Only the lines where ``_ANY_KEYWORD`` matches are checked, so a long value costs one search.
+    """
+    start = 0
+    m = _ANY_KEYWORD.search( text )
+    while m is not None :
+
+# match may start with the newline before the keyword
+#
+        pos = m.end() - 1
+        bol = text.rfind( "\n", 0, pos ) + 1
+        eol = text.find( "\n", pos )
+        if eol < 0 :
+            eol = len( text )
+        line += text.count( "\n", start, bol )
+        start = bol
+        s = text[bol:eol].strip()
+        for pat in KEYWORDS :
+            k = pat.search( s )
+            if k :
+                yield (line, k.group( 1 ))
+                break
+        m = _ANY_KEYWORD.search( text, eol )
+
 # value delimiter map: PLY token to what's passed by ``ContentHandler`` callback
 #
 TOKENS = {
     "CHARACTERS"   : None,
     "FRAMECODE"    : "$",
+    "SINGLEVALUE"  : "'",
+    "DOUBLEVALUE"  : '"',
     "SINGLESTART"  : "'",
     "TSINGLESTART" : "'''",
     "DOUBLESTART"  : '"',
@@ -70,16 +114,52 @@ TOKENS = {
 }
 
 #
-__all__ = ["TOKENS", "KEYWORDS", "SasException",
+__all__ = ["TOKENS", "KEYWORDS", "find_keywords", "SasException",
     "ContentHandlerBase", "ParserBase",
     "StarLexer",
-    "ErrorHandler", "ContentHandler", "ContentHandler2", "SasContentHandler",
+    "ErrorHandler", "ContentHandler", "ContentHandler2", "SasContentHandler", "RowContentHandler",
     "SasParser", "SansParser", "SansParser2",
     "CifParser",
     "DdlParser",
 #    "QuickCheck"
     ]
 
+# python 3.7 and later call module-level ``__getattr__`` for names the module doesn't have
+# (PEP 562). python 2 has none: swap this module for an instance of a module subclass that has
+# one. (keep a reference to the original module: its globals are our functions' globals.)
+#
+import importlib
+
+def _import_parser( name ) :
+    """dialect parser class ``name``"""
+    if name not in _PARSERS :
+        raise AttributeError( "module %r has no attribute %r" % (__name__, name) )
+    (module, attr) = _PARSERS[name]
+    return getattr( importlib.import_module( module, __name__ ), attr )
+
+if sys.version_info >= (3, 7) :
+
+    def __getattr__( name ) :
+        rc = _import_parser( name )
+        globals()[name] = rc
+        return rc
+
+else :
+    import types
+
+    class _Package( types.ModuleType ) :
+        """``sas`` package that imports dialect parsers on first access"""
+
+        def __getattr__( self, name ) :
+            rc = _import_parser( name )
+            setattr( self, name, rc )
+            return rc
+
+    _package = _Package( __name__, __doc__ )
+    _package.__dict__.update( globals() )
+    _package._module = sys.modules[__name__]
+    sys.modules[__name__] = _package
+
 #
 #
 #
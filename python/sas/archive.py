@@ -0,0 +1,142 @@
+#!/usr/bin/python -u
+#
+# read STAR files straight out of tar and zip archives
+#
+
+"""
+STAR files in tar and zip archives
+
+Members are read from the archive as streams, one after another: nothing is extracted to disk.
+A tar archive can be compressed (gzip, bzip2, xz) and, if it's a file name or a file that can
+seek, is opened for random access. Otherwise (e.g. ``sys.stdin.buffer``) it is read as a stream,
+in one pass (python 2 reads each member of a tar stream into memory). A zip archive must be a
+file name or a file that can seek. Members that are themselves compressed (``.str.gz`` in a tar)
+are decompressed by the lexer.
+
+  for (name, ch) in sas.archive.parse_members( "entries.tar.gz", sas.SansParser,
+                                               lambda name : (h, h), pattern = "*.str" ) :
+      ...
+"""
+
+from __future__ import absolute_import
+
+import sys
+import os
+import io
+import fnmatch
+import tarfile
+import zipfile
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+try :
+    basestring
+except NameError :
+    basestring = str
+
+#
+#
+def _seekable( fp ) :
+    """True if file object ``fp`` can seek"""
+    if hasattr( fp, "seekable" ) :
+        return fp.seekable()
+    try :
+        fp.tell()
+    except (AttributeError, IOError) :
+        return False
+    return True
+
+#
+#
+def _is_zip( archive ) :
+    """True if file name or seekable file ``archive`` is a zip file. The file is left where it was."""
+    if isinstance( archive, basestring ) :
+        return zipfile.is_zipfile( archive )
+    pos = archive.tell()
+    try :
+        return zipfile.is_zipfile( archive )
+    finally :
+        archive.seek( pos )
+
+#
+#
+def is_archive( archive ) :
+    """True if ``archive`` (file name) is a tar or zip file"""
+    return zipfile.is_zipfile( archive ) or tarfile.is_tarfile( archive )
+
+#
+#
+def members( archive, pattern = None ) :
+    """
+    generator: (name, file) for each regular file in tar or zip ``archive``
+
+    ``archive`` is a file name or a file object opened in binary mode
+    ``pattern``: only yield members whose name matches this ``fnmatch`` pattern, e.g. "*.str"
+
+    ``file`` is a binary file object. Read it before taking the next member: a tar read as a
+    stream can't go back.
+    """
+    if isinstance( archive, basestring ) :
+        seekable = True
+    else :
+        seekable = _seekable( archive )
+
+    if seekable and _is_zip( archive ) :
+        with zipfile.ZipFile( archive ) as z :
+            for info in z.infolist() :
+                if info.filename.endswith( "/" ) : continue
+                if (pattern is not None) and not fnmatch.fnmatch( info.filename, pattern ) :
+                    continue
+                with z.open( info ) as f :
+                    yield (info.filename, f)
+        return
+
+    if isinstance( archive, basestring ) :
+        tar = tarfile.open( name = archive, mode = "r:*" )
+    else :
+        tar = tarfile.open( fileobj = archive, mode = (seekable and "r:*" or "r|*") )
+    try :
+        for info in tar :
+            if not info.isfile() : continue
+            if (pattern is not None) and not fnmatch.fnmatch( info.name, pattern ) :
+                continue
+            f = tar.extractfile( info )
+
+# python 2 member of a tar stream can't peek() or seek() back for the lexer to check if it's
+# compressed: it's read into memory
+#
+            if not (seekable or hasattr( f, "peek" )) :
+                f = io.BytesIO( f.read() )
+            yield (info.name, f)
+    finally :
+        tar.close()
+
+#
+#
+def parse_members( archive, parser, handlers, pattern = None, verbose = False, wanted = None, **lexer_args ) :
+    """
+    generator: parse each member of ``archive`` (see ``members()``)
+
+    ``parser`` is the parser class, e.g. ``sas.SansParser``
+    ``handlers( name )`` returns a (content handler, error handler) pair for member ``name``
+    ``wanted`` is passed to the parser, see ``sas.ParserBase``
+    ``lexer_args`` are passed to ``StarLexer``
+
+    Yields (name, content handler) after the member's parsed. One lexer reads all members: it is
+    ``reset()`` for each, so every member starts with a clean lexer.
+    """
+    lexer = sas.StarLexer( verbose = verbose, **lexer_args )
+    for (name, fp) in members( archive, pattern ) :
+        (ch, eh) = handlers( name )
+        lexer.reset( fp )
+        parser.parse( lexer = lexer, content_handler = ch, error_handler = eh, verbose = verbose,
+            wanted = wanted )
+        yield (name, ch)
+    lexer.reset()
+
+#
+# eof
+#
@@ -0,0 +1,240 @@
+#!/usr/bin/python -u
+#
+# loops as columns
+#
+
+"""
+Loop tables collected into columns
+
+``ColumnHandler`` is a ``RowContentHandler`` that keeps every loop as a ``Loop``: one column per
+tag, a list of values while the loop is read. At the end of the loop columns of numbers are
+converted all at once: to NumPy arrays if NumPy is installed, otherwise to ``array.array``
+(or lists of ``int`` and ``float`` with ``storage = "list"``). Other columns stay lists of strings.
+
+  h = sas.columns.ColumnHandler()
+  sas.SansParser.parse( "bmr15334_3.str", h, sas.ErrorHandler() )
+  for loop in h.find( "_Atom_chem_shift.Val" ) :
+      shifts = loop["_Atom_chem_shift.Val"]
+
+A column of numbers is one where every value is an integer or a decimal number, or a STAR null
+("." or "?"). Numbers are ASCII digits with an optional sign, fraction and exponent (``-1.5e3``):
+"nan", "inf", "1_000" and CIF's "1.23(4)" are strings. Nulls are NaN, so a column of integers
+with nulls in it is a column of floats. A column of nulls only is not a column of numbers.
+Integers that don't fit in 64 bits are a list of python ``int`` in every storage.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import os
+import array
+import collections
+import re
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# STAR nulls. ``None`` is for the missing values in the last row of a loop with count error.
+#
+_NULLS = frozenset( (".", "?", None) )
+_NAN = float( "nan" )
+
+# numbers are ASCII digits with optional sign, fraction and exponent: not what else ``int()`` and
+# ``float()`` take ("nan", "inf", "1_000", non-ASCII digits), nor CIF's "1.23(4)"
+#
+_INTEGER = re.compile( r"[+-]?[0-9]+\Z" ).match
+_NUMBER = re.compile( r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?\Z" ).match
+
+# 64-bit integers (python 2 has no "q" and no ``array.typecodes``: its "l" is C long)
+#
+_LONG = ("q" in getattr( array, "typecodes", "" )) and "q" or "l"
+
+#
+#
+def _kind( values ) :
+    """"l" if ``values`` are integers, "d" if they are numbers, "n" if numbers and nulls,
+    None if they aren't numbers or are nulls only"""
+    nums = [v for v in values if v not in _NULLS]
+    if len( nums ) < 1 :
+        return None
+    if len( nums ) < len( values ) :
+        return all( map( _NUMBER, nums ) ) and "n" or None
+    if all( map( _INTEGER, nums ) ) :
+        return "l"
+    return all( map( _NUMBER, nums ) ) and "d" or None
+
+#
+#
+def _numbers( values, kind ) :
+    """``values`` of ``kind`` as a list of ``int`` ("l") or ``float`` (else), nulls are NaN"""
+    if kind == "l" :
+        return list( map( int, values ) )
+    if kind == "d" :
+        return list( map( float, values ) )
+    return [(_NAN if v in _NULLS else float( v )) for v in values]
+
+#
+#
+def _numpy_numbers( values, kind ) :
+    """NumPy array of ``values`` of ``kind``, or None if the integers don't fit in 64 bits"""
+    if kind == "n" :
+        return numpy.array( _numbers( values, kind ), dtype = numpy.float64 )
+    try :
+        return numpy.array( values ).astype( (kind == "l") and numpy.int64 or numpy.float64 )
+    except OverflowError :
+        return None
+
+# loop table
+#
+class Loop( object ) :
+    """
+    Loop read by ``ColumnHandler``
+
+    ``tags``: loop tags in order
+    ``columns``: tag -> column, values in row order
+    ``saveframe``: name of the saveframe the loop is in, ``None`` outside of saveframes (mmCIF)
+    ``line``: line number of the first tag
+    """
+
+    def __init__( self, tags, saveframe, line ) :
+        self.tags = tags
+        self.columns = collections.OrderedDict( (tag, []) for tag in tags )
+        self.saveframe = saveframe
+        self.line = line
+        self._short = False
+
+    def __getitem__( self, tag ) :
+        return self.columns[tag]
+
+    def __contains__( self, tag ) :
+        return tag in self.columns
+
+    def __len__( self ) :
+        """number of rows"""
+        if len( self.tags ) < 1 :
+            return 0
+        return len( self.columns[self.tags[0]] )
+
+    def _add( self, rows ) :
+        """add a batch of rows"""
+        width = len( self.tags )
+        if len( rows[-1] ) < width :
+            rows[-1] = rows[-1] + [None] * (width - len( rows[-1] ))
+            self._short = True
+        for (column, values) in zip( self.columns.values(), zip( *rows ) ) :
+            column.extend( values )
+
+    def _convert( self, storage, tags ) :
+        """convert columns of numbers. integers that don't fit in 64 bits are a list of ``int``
+        in every storage"""
+        for tag in self.tags :
+            if (tags is not True) and (tag not in tags) :
+                continue
+            kind = _kind( self.columns[tag] )
+            if kind is None :
+                continue
+            if storage == "numpy" :
+                nums = _numpy_numbers( self.columns[tag], kind )
+                if nums is not None :
+                    self.columns[tag] = nums
+                    continue
+            nums = _numbers( self.columns[tag], kind )
+            if storage == "array" :
+                try :
+                    self.columns[tag] = array.array( (kind == "l") and _LONG or "d", nums )
+                    continue
+                except OverflowError :
+                    pass
+            self.columns[tag] = nums
+
+#
+#
+class ColumnHandler( sas.RowContentHandler ) :
+    """
+    Content handler that collects loops into columns, see module documentation.
+
+    ``storage``: "numpy", "array" or "list": what columns of numbers are converted to.
+                 Default is "numpy" if NumPy is installed, otherwise "array".
+    ``convert``: ``True`` to convert all columns of numbers, ``False`` to keep all values as
+                 strings, or a collection of tags whose columns are converted if they're numbers.
+
+    After parsing, ``loops`` is the list of ``Loop``s in the order they were read, and ``items``
+    is a dict of free data item tag -> list of values (a tag may be in more than one saveframe).
+    """
+
+    batch = 4096
+
+    def __init__( self, storage = None, convert = True ) :
+        if storage is None :
+            storage = (numpy is not None) and "numpy" or "array"
+        if storage not in ("numpy", "array", "list") :
+            raise ValueError( "invalid storage: %s" % (storage,) )
+        if (storage == "numpy") and (numpy is None) :
+            raise ImportError( "numpy storage needs numpy" )
+        self._storage = storage
+        if (convert is not True) and (convert is not False) :
+            convert = frozenset( convert )
+        self._convert = convert
+        self.loops = []
+        self.items = collections.OrderedDict()
+        self._saveframe = None
+        self._loop = None
+
+    def find( self, tag ) :
+        """generator: loops that have ``tag``"""
+        for loop in self.loops :
+            if tag in loop :
+                yield loop
+
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        self._saveframe = name
+        return False
+    def endSaveframe( self, line, name ) :
+        self._saveframe = None
+        return False
+    def startLoop( self, line ) :
+        self._loop = None
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        self.items.setdefault( tag, [] ).append( val )
+        return False
+
+    def loopHeader( self, line, tags ) :
+        self._loop = Loop( tags, self._saveframe, line )
+        self.loops.append( self._loop )
+        return False
+
+    def rows( self, line, rows ) :
+        self._loop._add( rows )
+        return False
+
+    def endLoop( self, line ) :
+        if (self._loop is not None) and (self._convert is not False) :
+            self._loop._convert( self._storage, self._convert )
+        self._loop = None
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+    h = ColumnHandler()
+    with sas.timer( "columns" ) :
+        sas.SansParser.parse( lexer = sas.StarLexer( fp = sys.stdin ), content_handler = h,
+            error_handler = sas.ErrorHandler() )
+    for loop in h.loops :
+        sys.stdout.write( "%s: %d rows\n" % (", ".join( loop.tags[:3] ), len( loop )) )
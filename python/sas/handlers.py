@@ -12,10 +12,14 @@ from __future__ import absolute_import
 import sys
 import abc
 
+# abstract base: python 3 ignores ``__metaclass__``, this works in both
+#
+_Abstract = abc.ABCMeta( "_Abstract", (object,), {} )
+
 # fatal error terminates parsing, but error and warning don't have to.
 # override them to return False and keep going (use at own risk!)
 #
-class ErrorHandler :
+class ErrorHandler( _Abstract ) :
     """
     Error handlers are common to all parser versions.
 
@@ -24,7 +28,6 @@ class ErrorHandler :
     Non-fatal error and warning callbacks may return ``False`` to continue parsing
     (use at own risk, of course).
     """
-    __metaclass__ = abc.ABCMeta
     def fatalError( self, line, msg ) :
         sys.stderr.write("critical parse error in line %s: %s\n" % (line, msg))
     def error( self, line, msg ) :
@@ -36,13 +39,11 @@ class ErrorHandler :
 
 # base class for content handlers
 #
-class ContentHandlerBase :
+class ContentHandlerBase( _Abstract ) :
     """
     Methods common to all content handlers
     """
 
-    __metaclass__ = abc.ABCMeta
-
     # not abstract because global blocks aren't used in mmcif or nmr-star
     #
     def startGlobal( self, line ) :
@@ -97,6 +98,32 @@ class ContentHandler( ContentHandlerBase ) :
     def data( self, tag, tagline, val, valline, delim, inloop ) :
         raise Exception( "Abstract method called" )
 
+#
+# This content handler gets loops as rows of values
+#
+class RowContentHandler( ContentHandler ) :
+    """
+    ``ContentHandler`` that gets loop values in rows, not one ``data()`` call per value.
+
+    ``data()`` is called for free data items only (``inloop`` is always ``False``). In a loop
+    the parser calls ``loopHeader()`` with the tags before the first value, then ``rows()``
+    with lists of up to ``batch`` rows, the last of them before ``endLoop()``.
+
+    Each row is a list of values, one per tag. Value delimiters are not passed. If the number
+    of values is not a multiple of the number of tags (loop count error) the last row is short.
+    """
+
+    # number of rows per ``rows()`` call: 1 for one row at a time
+    #
+    batch = 1024
+
+    @abc.abstractmethod
+    def loopHeader( self, line, tags ) :
+        raise Exception( "Abstract method called" )
+    @abc.abstractmethod
+    def rows( self, line, rows ) :
+        raise Exception( "Abstract method called" )
+
 #
 # This content handler has separate callbacks for tag and value
 #
@@ -19,9 +19,15 @@ The *-ish* above refers to
   * Lack of support for STAR-2012 extensions: triple-quoted values are supported, but lists, tables,
     and ref-tables (references) are not.
 
-The lexer is fastest when you feed it one line at a time. They must be whole lines, or 
-semicolon-delimited values may not be recognized properly. When parsing a ``file`` the scanner
-will buffer lines of input. Setting buffer size to 0 makes it buffer one line at a time.
+If you feed the lexer via ``send()``, you must send whole lines, or semicolon-delimited values
+may not be recognized properly. When reading a file (or any file-like object that iterates over
+lines) the lexer buffers lines of input and cuts the buffer between lines, outside of semicolon-
+delimited values. Setting buffer size to 0 makes it buffer (about) one line at a time. Given a file
+name instead, the lexer memory-maps the file and scans it as one buffer.
+
+Files and binary streams compressed with gzip, bzip2 or xz are recognized by their first bytes and
+decompressed as they are read, ``_BLOCK`` bytes at a time. (A stream is only checked if it can
+``peek()`` or ``seek()``: ``sys.stdin.buffer`` can, a pipe in python 2 can't.)
 
 STAR references:
 
@@ -49,15 +55,85 @@ from __future__ import absolute_import
 import sys
 import os
 import re
-import ply.lex as lex
-import collections
+import mmap
+import hashlib
+import importlib
 import types
-import pprint
 
 _UP = os.path.join( os.path.split( __file__ )[0], ".." )
-sys.path.append( os.path.realpath( _UP ) )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
 import sas
 
+try :
+    basestring
+except NameError :
+    basestring = str
+
+# python 3 PLY lexer only scans str: bytes input is decoded first
+#
+_PY3 = str is not bytes
+
+# ASCII whitespace in python 3 regexps, see ``StarLexer``. (a number: PLY writes it to lextab as is)
+#
+_REFLAGS = int( getattr( re, "ASCII", 0 ) )
+
+# first character of a line that opens or closes a semicolon-delimited value, str or bytes
+#
+_SEMICOLON = (";", b";")
+
+# compressed input: (magic bytes, module, decompressor factory). modules are imported when needed,
+# ``lzma`` (for xz) may not be there in python 2.
+#
+_COMPRESSION = (
+    (b"\x1f\x8b", "zlib", lambda m : m.decompressobj( 16 + m.MAX_WBITS )),
+    (b"BZh", "bz2", lambda m : m.BZ2Decompressor()),
+    (b"\xfd7zXZ\x00", "lzma", lambda m : m.LZMADecompressor())
+)
+_MAGIC = max( len( c[0] ) for c in _COMPRESSION )
+_BLOCK = 1 << 20
+
+def _decompressor( head ) :
+    """returns decompressor factory for input that starts with ``head``, ``None`` if not compressed"""
+    if not isinstance( head, bytes ) :
+        return None
+    for (magic, module, factory) in _COMPRESSION :
+        if head.startswith( magic ) :
+            m = importlib.import_module( module )
+            return lambda : factory( m )
+    return None
+
+def _sniff( fp ) :
+    """returns decompressor factory for compressed binary stream ``fp``, ``None`` if it isn't one
+    (or can't tell). Nothing is read off the stream."""
+    if hasattr( fp, "peek" ) :
+        return _decompressor( fp.peek( _MAGIC )[:_MAGIC] )
+    if not getattr( fp, "seekable", lambda : True )() :
+        return None
+    try :
+        pos = fp.tell()
+        head = fp.read( _MAGIC )
+        fp.seek( pos )
+    except (AttributeError, IOError, ValueError) :
+        return None
+    return _decompressor( head )
+
+def _decompress( fp, new ) :
+    """generator: decompressed ``_BLOCK``s of ``fp``. ``new()`` makes a decompressor, a new one
+    for every stream if there are several back to back (e.g. ``cat a.gz b.gz``)."""
+    d = new()
+    data = fp.read( _BLOCK )
+    while len( data ) > 0 :
+        yield d.decompress( data )
+
+# leftover is the next stream. zero bytes between streams are padding (tar does that).
+#
+        data = d.unused_data.lstrip( b"\0" )
+        if (len( data ) > 0) or getattr( d, "eof", False ) :
+            d = new()
+        if len( data ) < 1 :
+            data = fp.read( _BLOCK )
+
 ################################################################
 # PLY lexer for STAR-ish input
 # read the fine comments below
@@ -75,6 +151,10 @@ class StarLexer( object ) :
     Methods prefixed with ``t_`` are how PLY defines lexer tokens. Read PLY manual for details.
     """
 
+# tokens are read from the lexer this many at a time, see tokens_batch()
+
+    _batch = 512
+
 # lexical states
 
     states = (
@@ -107,6 +187,8 @@ class StarLexer( object ) :
         "SAVEEND",
         "LOOPSTART",
         "STOP",
+        "SINGLEVALUE",
+        "DOUBLEVALUE",
         "SINGLESTART",
         "SINGLEEND",
         "TSINGLESTART",
@@ -124,7 +206,7 @@ class StarLexer( object ) :
 
 # this is for lookahead/behind
 #
-    whitespace_pattern = re.compile( r"\s" )
+    whitespace_pattern = re.compile( r"\s", _REFLAGS )
     newline_pattern = re.compile( r"\n" )
 
 # token regexps
@@ -151,6 +233,8 @@ class StarLexer( object ) :
 #          blank     = \s
 #          newline   = \n
 #          non-blank = \S
+# with ASCII ``\s``: [ \t\n\r\f\v]. Python 3 regexps are compiled with ``re.ASCII`` (here and in
+# ``sas.scanner``) so str and bytes input, and both engines, have the same whitespace.
 
 # STAR-2012 further specifies that any character outside of (U+0007, U+0009, U+000A, U+000D,
 #  U+0020..U+D7FF, U+E000..U+FFFD, U+10000..U+10FFF) range is illegal and throws a lexer error.
@@ -160,7 +244,7 @@ class StarLexer( object ) :
 
 # need lookahead/lookbehind for "\n;", " '", and "' "
 #
-# \s with unicode flag will match [ \t\n\r\f\v] plus unicode spaces. We need to differentiate
+# \s matches [ \t\n\r\f\v]. We need to differentiate
 # between space and (system-dependent?) \n for the "\n;". Simple stupid way: define space as
 # a token and ignore it in the parser later.
 #
@@ -173,8 +257,17 @@ class StarLexer( object ) :
         raise sas.SasException( msg = "Newline in quoted value", line = t.lexer.lineno )
 
     #  keep count
+    #  outside of values they're only returned if we want whitespace tokens
     #
-    def t_ANY_NL( self, t ) :
+    def t_NL( self, t ) :
+        r'\n+'
+        t.lexer.lineno += len( t.value )
+        if self._whitespace :
+            return t
+
+    #  inside multi-line values they're part of the value
+    #
+    def t_YYTSINGLE_YYTDOUBLE_YYSEMI_NL( self, t ) :
         r'\n+'
         t.lexer.lineno += len( t.value )
         return t
@@ -187,12 +280,9 @@ class StarLexer( object ) :
     # 
     def t_SPACE( self, t ) :
         r"\s+"
-        if self._verbose :
-            sys.stdout.write( "Space in line %d\n" % (t.lexer.lineno,) )
-        for c in t.value :
-            if c == "\n" :
-                t.lexer.lineno += 1
-        return t
+        t.lexer.lineno += t.value.count( "\n" )
+        if self._whitespace :
+            return t
 
 ##############################################
 # single and double quotes: the opening digraph is space+quote, closing is quote+space.
@@ -203,8 +293,6 @@ class StarLexer( object ) :
     #
     def t_ANY_ESQUOTE( self, t ) :
         r"\x07'"
-        if self._verbose :
-            sys.stdout.write( "Escaped single quote in line %d\n" % (t.lexer.lineno,) )
         t.type = "CHARACTERS"
         t.value = t.value.lstrip( "\x07" )
         return t
@@ -214,8 +302,6 @@ class StarLexer( object ) :
     #
     def t_TSQUOTE( self, t ) :
         r"'''"
-        if self._verbose :
-            sys.stdout.write( "Opening 3xsingle quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.push_state( "YYTSINGLE" )
         t.type = "TSINGLESTART"
         return t
@@ -225,24 +311,28 @@ class StarLexer( object ) :
     #
     def t_YYTSINGLE_TSQUOTE( self, t ) :
         r"'''"
-        if self._verbose :
-            sys.stdout.write( "Closing 3xsingle quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.pop_state()
         t.type = "TSINGLEEND"
         return t
 
     def t_YYTSINGLE_CHARACTERS( self, t ) :
         r"(?:[^']+)|'{1,2}"
-        if self._verbose :
-            sys.stdout.write( "Line in triple-quotes (%d): |%s|\n" % (t.lexer.lineno,t.value) )
+        t.lexer.lineno += t.value.count( "\n" )
+        return t
+
+    # the common case: whole single-quoted value on one line, no escapes.
+    # the closing quote is the first one followed by whitespace (or end of input).
+    # anything else falls through to YYSINGLE below.
+    #
+    def t_SINGLEVALUE( self, t ) :
+        r"'(?!'')(?:[^'\n\x07]|'(?=\S))*'(?=\s|\Z)"
+        t.value = t.value[1:-1]
         return t
 
     # unescaped single quote in YYINITIAL starts YYSINGLE
     #
     def t_SQUOTE( self, t ) :
         r"'"
-        if self._verbose :
-            sys.stdout.write( "Opening single quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.push_state( "YYSINGLE" )
         t.type = "SINGLESTART"
         return t
@@ -251,13 +341,11 @@ class StarLexer( object ) :
     #
     def t_YYSINGLE_SQUOTE( self, t ) :
         r"'"
-        if self._verbose :
-            sys.stdout.write( "Single quote in line %d\n" % (t.lexer.lineno,) )
 
 # lookahead
 #  input reader must split on newlines or this will not work
 #
-        if t.lexer.lexpos == len( t.lexer.lexdata ) - 1 :
+        if t.lexer.lexpos >= len( t.lexer.lexdata ) :
             t.type = "SINGLEEND"
             t.lexer.pop_state()
             return t
@@ -277,8 +365,6 @@ class StarLexer( object ) :
 
     def t_YYDOUBLE_YYSEMI_SQUOTE( self, t ) :
         r"'"
-        if self._verbose :
-            sys.stdout.write( "Single quote in line %d\n" % (t.lexer.lineno,) )
         t.type = "CHARACTERS"
         return t
 
@@ -286,8 +372,6 @@ class StarLexer( object ) :
     #
     def t_YYSINGLE_CHARACTERS( self, t ) :
         r"[^'\x07\n]+"
-        if self._verbose :
-            sys.stdout.write( "chars in single quotes in line %d: |%s\n" % (t.lexer.lineno,t.value) )
         return t
 
 ##################################
@@ -297,9 +381,7 @@ class StarLexer( object ) :
     #
     def t_ANY_EDQUOTE( self, t ) :
         r'\x07"'
-        if self._verbose :
-            sys.stdout.write( "Escaped double quote in line %d\n" % (t.lexer.lineno,) )
-        t.type = "characters"
+        t.type = "CHARACTERS"
         t.value = t.value.lstrip( "\x07" )
         return t
 
@@ -308,8 +390,6 @@ class StarLexer( object ) :
     #
     def t_TDQUOTE( self, t ) :
         r'"""'
-        if self._verbose :
-            sys.stdout.write( "Opening 3xdouble quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.push_state( "YYTDOUBLE" )
         t.type = "TDOUBLESTART"
         return t
@@ -319,24 +399,26 @@ class StarLexer( object ) :
     #
     def t_YYTDOUBLE_TDQUOTE( self, t ) :
         r'"""'
-        if self._verbose :
-            sys.stdout.write( "Closing 3xdouble quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.pop_state()
         t.type = "TDOUBLEEND"
         return t
 
     def t_YYTDOUBLE_CHARACTERS( self, t ) :
         r'(?:[^"]+)|"{1,2}'
-        if self._verbose :
-            sys.stdout.write( "Line in triple-double-quotes (%d): |%s|\n" % (t.lexer.lineno,t.value) )
+        t.lexer.lineno += t.value.count( "\n" )
+        return t
+
+    # whole double-quoted value on one line
+    #
+    def t_DOUBLEVALUE( self, t ) :
+        r'"(?!"")(?:[^"\n\x07]|"(?=\S))*"(?=\s|\Z)'
+        t.value = t.value[1:-1]
         return t
 
     # unescaped double quote in YYINITIAL
     #
     def t_DQUOTE( self, t ) :
         r'"'
-        if self._verbose :
-            sys.stdout.write( "Opening double quote in line %d\n" % (t.lexer.lineno,) )
         t.lexer.push_state( "YYDOUBLE" )
         t.type = "DOUBLESTART"
         return t
@@ -345,13 +427,11 @@ class StarLexer( object ) :
     #
     def t_YYDOUBLE_DQUOTE( self, t ) :
         r'"'
-        if self._verbose :
-            sys.stdout.write( "Double quote in line %d\n" % (t.lexer.lineno,) )
 
 # lookahead
 #  input reader must split on newlines or this will not work
 #
-        if t.lexer.lexpos == len( t.lexer.lexdata ) - 1 :
+        if t.lexer.lexpos >= len( t.lexer.lexdata ) :
             t.type = "DOUBLEEND"
             t.lexer.pop_state()
             return t
@@ -371,8 +451,6 @@ class StarLexer( object ) :
     #
     def t_YYSINGLE_YYSEMI_DQUOTE( self, t ) :
         r'"'
-        if self._verbose :
-            sys.stdout.write( "Double quote in line %d\n" % (t.lexer.lineno,) )
         t.type = "CHARACTERS"
         return t
 
@@ -380,8 +458,6 @@ class StarLexer( object ) :
     #
     def t_YYDOUBLE_CHARACTERS( self, t ) :
         r'[^"\x07\n]+'
-        if self._verbose :
-            sys.stdout.write( "chars in double quotes in line %d: |%s\n" % (t.lexer.lineno,t.value) )
         return t
 
 #######################################################
@@ -396,8 +472,6 @@ class StarLexer( object ) :
     #
     def t_SEMICOLON( self, t ) :
         r";"
-        if self._verbose :
-            sys.stdout.write( "Semicolon in line %d\n" % (t.lexer.lineno,) )
 #            print ">>> lexpos=", t.lexer.lexpos, ":", t.lexer.lexdata[t.lexer.lexpos - 2], ":"
 
 # start of chunk or lookbehind
@@ -424,8 +498,6 @@ class StarLexer( object ) :
     #
     def t_YYSEMI_SEMICOLON( self, t ) :
         r";"
-        if self._verbose :
-            sys.stdout.write( "Semicolon in YYSEMI line %d\n" % (t.lexer.lineno,) )
 
         if t.lexer.lexpos == 1 :
             t.lexer.pop_state()
@@ -448,8 +520,6 @@ class StarLexer( object ) :
     #
     def t_YYSINGLE_YYDOUBLE_SEMICOLON( self, t ) :
         r";"
-        if self._verbose :
-            sys.stdout.write( "Semicolon in quoted value in line %d\n" % (t.lexer.lineno,) )
 
         t.type = "CHARACTERS"
         return t
@@ -458,8 +528,6 @@ class StarLexer( object ) :
     #
     def t_YYSEMI_CHARACTERS( self, t ) :
         r".+"
-        if self._verbose :
-            sys.stdout.write( "Line in semicolons (%d): |%s|\n" % (t.lexer.lineno,t.value) )
         return t
 
 #######################################################
@@ -479,21 +547,17 @@ class StarLexer( object ) :
         t.value = t.value[1:]
         return t
 
+    # trailing whitespace is part of the match: count newlines in it
     #
-    #
-
     def t_GLOBALSTART( self, t ) :
         r"[Gg][Ll][Oo][Bb][Aa][Ll]_(\s+|$)"
-        if self._verbose :
-            sys.stdout.write( "%s: Start global block in line %d\n" % (self.__class__.__name__,t.lexer.lineno,) )
+        t.lexer.lineno += t.value.count( "\n" )
         return t
 
     # strip "data_"
     #
     def t_DATASTART( self, t ) :
         r"[Dd][Aa][Tt][Aa]_\S+"
-        if self._verbose :
-            sys.stdout.write( "%s: Start data |%s| in line %d\n" % (self.__class__.__name__,t.value,t.lexer.lineno,) )
         t.value = t.value[5:]
         return t
 
@@ -501,33 +565,26 @@ class StarLexer( object ) :
     #
     def t_SAVESTART( self, t ) :
         r"save_\S+"
-        if self._verbose :
-            sys.stdout.write( "%s: Start saveframe |%s| in line %d\n" % (self.__class__.__name__,t.value,t.lexer.lineno,) )
         t.value = t.value[5:]
         return t
 
-    #
+    # same as global_
     #
     def t_SAVEEND( self, t ) :
         r"save_(\s+|$)"
-        if self._verbose :
-            sys.stdout.write( "%s: End saveframe in line %d\n" % (self.__class__.__name__,t.lexer.lineno,) )
+        t.lexer.lineno += t.value.count( "\n" )
         return t
 
     #
     #
     def t_LOOPSTART( self, t ) :
         r"loop_"
-        if self._verbose :
-            sys.stdout.write( "%s: Start loop in line %d\n" % (self.__class__.__name__,t.lexer.lineno,) )
         return t
 
     #
     #
     def t_STOP( self, t ) :
         r"stop_"
-        if self._verbose :
-            sys.stdout.write( "%s: End loop in line %d\n" % (self.__class__.__name__,t.lexer.lineno,) )
         return t
 
 #######################################################
@@ -547,8 +604,6 @@ class StarLexer( object ) :
     #
     def t_TAGNAME( self, t ) :
         r"_\S+"
-        if self._verbose :
-            sys.stdout.write( "%s: Tag in line %d: |%s|\n" % (self.__class__.__name__,t.lexer.lineno,t.value) )
         return t
 
 #######################################################
@@ -558,8 +613,6 @@ class StarLexer( object ) :
     #
     def t_FRAMECODE( self, t ) :
         r"\$\S+"
-        if self._verbose :
-            sys.stdout.write( "%s: Framecode value in line %d: |%s|\n" % (self.__class__.__name__,t.lexer.lineno,t.value) )
         t.value = t.value.lstrip( "$" )
         return t
 
@@ -567,8 +620,6 @@ class StarLexer( object ) :
     #
     def t_CHARACTERS( self, t ) :
         r"\S+"
-        if self._verbose :
-            sys.stdout.write( "%s: Bareword value in line %d: |%s|\n" % (self.__class__.__name__,t.lexer.lineno,t.value) )
 
 # not sure if I want to do this:
 #
@@ -584,24 +635,78 @@ class StarLexer( object ) :
 #######################################################
 # class, generator, iterator, etc.
 
+    # ``verbose = True`` makes an instance of the debug subclass (below): the rules above
+    # and ``next()`` have no tracing branches in them.
     #
+    def __new__( cls, *args, **kwargs ) :
+        if kwargs.get( "verbose", (len( args ) > 2) and args[2] ) :
+            cls = _verbose_class( cls )
+        return object.__new__( cls )
+
     #
-    def __init__( self, fp = None, bufsize = 65534, verbose = False, **lexer_args ) :
+    #
+    def __init__( self, fp = None, bufsize = 65534, verbose = False, engine = "ply", bulk = False,
+            semiblock = False, whitespace = True, lazylines = False, vectorize = False,
+            encoding = "utf-8", **lexer_args ) :
         """
         constructor
 
-        ``fp`` is a ``file`` object (or feed me lines via ``send()``)
-        ``bufsize``: read input lines (``fp.readline()``) into a buffer until it's over ``bufsize``,
-                     then parse the buffer
-        ``lexer_args`` are passed on to PLY lexer
+        ``fp`` is a ``file`` or any other file-like object that iterates over lines
+               (or feed me lines via ``send()``), or a file name: the file is memory-mapped
+               and scanned as one buffer (``bufsize`` is ignored). Compressed files and binary
+               streams (gzip, bzip2, xz) are decompressed as they're read.
+        ``bufsize``: read input lines into a buffer until it's over ``bufsize``, then parse
+                     the buffer
+        ``engine``: "ply" runs the ``t_`` rules below through PLY, "regex" uses the equivalent
+                    single-regex ``sas.scanner.Scanner`` which is much faster
+        ``bulk``: ("regex" engine only) return lines of bare loop values from a single
+                  ``split()``, without SPACE tokens between them. Faster on wide loop rows
+                  only: lines shorter than ``sas.scanner._BULK`` (48) characters are scanned
+                  as usual
+        ``semiblock``: ("regex" engine only) return the text of a semicolon-delimited value
+                       as one CHARACTERS token, newlines included
+        ``whitespace``: return NL and SPACE tokens between values. The parsers skip them, set it
+                        to ``False`` to not make them in the first place. (Newlines inside
+                        multi-line values are always returned, they are part of the value.)
+        ``lazylines``: ("regex" engine only) don't count lines as we go: token's ``lineno`` is
+                       a ``sas.scanner.Line`` that counts them if it's used (as a number,
+                       printed, etc.). Faster if handlers mostly ignore line numbers.
+        ``vectorize``: ("regex" engine only, needs numpy) ``bulk`` for a whole run of lines of
+                       bare loop values at once: their offsets and line numbers come from numpy
+                       arrays. Only faster on loops of many thousands of short rows, shorter
+                       runs of lines (and single long lines) are left to ``bulk``
+        ``encoding``: (python 3) of ``bytes`` input: memory-mapped files, files opened in
+                      binary mode, ``bytes`` given to ``send()``. "regex" engine scans the bytes
+                      and decodes token values, "ply" engine decodes the input buffer.
+        ``lexer_args`` are passed on to PLY lexer (ignored by "regex" engine)
         """
 
         if verbose : sys.stdout.write( self.__class__.__name__ + ".init()\n" )
 
+        assert engine in ("ply", "regex")
+        assert (engine == "regex") or not (bulk or semiblock or lazylines or vectorize)
+
         self._fp = fp
+        self._reader = None
+        self._tail = ""
+        self._pushed = []
+        self._error = None
         self._bufsize = bufsize
         self._verbose = bool( verbose )
-        self.lexer = lex.lex( module = self, errorlog = lex.NullLogger(), **lexer_args )
+        self._whitespace = bool( whitespace )
+        self._engine = engine
+        self._lazylines = bool( lazylines )
+        self._encoding = encoding
+        self._decode = _PY3 and (engine == "ply")
+
+# engines are imported when first used: a program only needs one
+#
+        if engine == "regex" :
+            from sas.scanner import Scanner
+            self.lexer = Scanner( bulk = bulk, semiblock = semiblock, whitespace = whitespace,
+                lazylines = lazylines, vectorize = vectorize, encoding = encoding )
+        else :
+            self.lexer = _ply_lexer( self, lexer_args )
 
     # iterator
     #
@@ -614,80 +719,500 @@ class StarLexer( object ) :
     def __next__( self ) :
         return self.next()
 
+    # generator: maps the whole file and feeds it to the lexer in one go
+    #
+    def _map_reader( self ) :
+        """memory-mapped input: the file is the buffer. Unmapped when the lexer's done with it."""
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._map_reader()\n" )
+        with open( self._fp, "rb" ) as f :
+
+# can't map an empty file
+#
+            if os.fstat( f.fileno() ).st_size < 1 :
+                return
+
+# compressed file is read, not mapped
+#
+            new = _decompressor( f.read( _MAGIC ) )
+            if new is not None :
+                f.seek( 0 )
+                for x in self._block_reader( _decompress( f, new ) ) :
+                    yield
+                return
+            buf = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ )
+            try :
+                self._input( buf )
+                yield
+            finally :
+
+# lazy line numbers count newlines in the buffer when they're used: leave it to the garbage collector
+#
+                if not self._lazylines :
+                    buf.close()
+
     # generator: reads the next chunk of input and feeds it to the lexer
     #
     def _input_reader( self ) :
-        """buffering input reader: reads lines until the buffer is greater than _bufsize,
-            then yields the buffer."""
+        """buffering input reader: reads lines until the buffer is at least _bufsize,
+            then feeds the buffer to the lexer and yields.
+
+        The buffer is only cut between whole lines and not inside a semicolon-delimited value
+        (the lexer doesn't care, but values that don't span buffers come out in fewer tokens).
+        Lines that start with a semicolon open and close those: that's not always true, e.g.
+        inside triple quotes, but then we just cut the buffer somewhere else."""
+
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._input_reader()\n" )
-        assert isinstance( self._fp, file )
-        buf = ""
+        buf = []
+        size = 0
+        insemi = False
         for line in self._fp :
-            buf += line
-            if len( buf ) >= self._bufsize :
-                self.lexer.input( buf )
-#                sys.stderr.write( "INP: buf is |%s|\n" % (buf,) )
+            buf.append( line )
+            size += len( line )
+            if line[:1] in _SEMICOLON :
+                insemi = not insemi
+            if (size >= self._bufsize) and (not insemi) :
+                self._input( line[:0].join( buf ) )
                 yield
-                buf = ""
+                buf = []
+                size = 0
 
 # out of for: last chunk
 #
         if len( buf ) > 0 :
-            self.lexer.input( buf )
+            self._input( buf[0][:0].join( buf ) )
+            yield
+
+    # generator: feeds the lexer blocks of decompressed input
+    #
+    def _block_reader( self, blocks ) :
+        """whole lines of each block go to the lexer, the rest goes in front of the next block:
+        same as ``send()`` and ``flush()``"""
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._block_reader()\n" )
+        for block in blocks :
+            self.send( block )
             yield
+        self.flush()
+        yield
+
+    #
+    #
+    def _input( self, data ) :
+        """set lexer's input buffer (decoded for python 3 PLY)"""
+        if self._decode and not isinstance( data, str ) :
+            data = data[:].decode( self._encoding )
+        self.lexer.input( data )
 
     #
     #
     def next( self ) :
         """returns the next lexer token"""
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + ".next()\n" )
 
+        if self._pushed :
+            return self._pushed.pop()
+
+# tokens are read a batch at a time and handed out from the push-back stack
+#
+        batch = self.tokens_batch()
+        if len( batch ) < 1 : raise StopIteration
+        batch.reverse()
+        self._pushed = batch
+        return batch.pop()
+
+    #
+    #
+    def tokens_batch( self, size = None ) :
+        """returns a list of the next tokens, empty list at the end of input.
+
+        That's the pushed-back tokens if there are any, else up to ``size`` (default
+        ``_batch``) tokens from the current input chunk. They are the same tokens ``next()``
+        returns, only a parser can loop over a list instead of calling ``next()`` for each.
+        ``push_back()`` the ones it doesn't use."""
+
+        if self._pushed :
+            batch = self._pushed[::-1]
+            self._pushed = []
+            return batch
 
-# fisrt chunk of data: if reading from a file we need to fire off the feeder
+# lexer error after the last batch: its tokens come first
 #
-        if self._fp is not None : inp = self._input_reader()
+        if self._error is not None :
+            e = self._error
+            self._error = None
+            raise e
 
-        if (self.lexer.lexdata is None) or (len( self.lexer.lexdata ) < 1) :
+        if size is None : size = self._batch
+        batch = []
 
-# if we're not reading a file, we must be fed via send()
-# tell 'em to feed us more input
+# PLY lexer raises an error if there was no input() yet
 #
-            if self._fp is None : raise StopIteration
+        if self.lexer.lexdata is not None :
+            self._read_batch( batch, size )
 
-# or else bite off a chunk ourselves
+# end of buffer: if we're not reading a file, we must be fed via send().
+# tell 'em to feed us more input.
+# or else bite off the next chunk ourselves. keep reading until there is a token: without
+# whitespace tokens a chunk may have none.
 #
-            else : inp.next()
+        while len( batch ) < 1 :
+            if self._fp is None : return batch
+            if self._reader is None :
+                if isinstance( self._fp, basestring ) :
+                    self._reader = self._map_reader()
+                else :
+                    new = _sniff( self._fp )
+                    if new is None :
+                        self._reader = self._input_reader()
+                    else :
+                        self._reader = self._block_reader( _decompress( self._fp, new ) )
+            try :
+                next( self._reader )
+            except StopIteration :
+                return batch
+            self._read_batch( batch, size )
+
+        return batch
+
+    #
+    #
+    def _read_batch( self, batch, size ) :
+        """append up to ``size`` tokens from the current input chunk to ``batch``.
+        A lexer error is held back until the tokens before it are used."""
+        try :
+            if self._engine == "regex" :
+                self.lexer.tokens( batch, size )
+                return
+            token = self.lexer.token
+            append = batch.append
+            for i in range( size ) :
+                t = token()
+                if t is None : break
+                append( t )
+        except sas.SasException as e :
+            if len( batch ) < 1 : raise
+            self._error = e
 
-#        sys.stderr.write( "LEX: before token, lexdata is |%s|\n" % (self.lexer.lexdata,) )
-        rc = self.lexer.token()
-#        sys.stderr.write( "LEX: token is |%s|\n" % (rc,) )
-#        pprint.pprint( rc )
-#        sys.stderr.write( "LEX: after token, lexdata is |%s|\n" % (self.lexer.lexdata,) )
-        if rc is None :
-            if self._fp is None : raise StopIteration
-            else : inp.next()
-            rc = self.lexer.token()
+    #
+    #
+    def push_back( self, token ) :
+        """return ``token`` to the lexer: it is the next one ``next()`` returns.
+
+        Tokens come back in reverse order of pushing, from anywhere in the input: the lexer
+        doesn't go back to re-read them."""
+
+        self._pushed.append( token )
+
+    #
+    #
+    def skip( self, types ) :
+        """drop the tokens up to the next one whose type is in ``types``: that's the next one
+        ``next()`` returns. At end of input there is none.
+
+        The regex engine steps over the input between keywords (and tags, if TAGNAME is in
+        ``types``) without making tokens, see ``sas.scanner.Scanner.skip()``. The PLY engine
+        makes them and drops them.
+
+        At end of input the last token skipped is returned as an NL token: the parser's EOF
+        line is the line of the last token it read."""
+
+        last = None
+        while True :
+            while self._pushed :
+                if self._pushed[-1].type in types :
+                    return
+                last = self._pushed.pop()
+
+            if (self._engine == "regex") and (self._error is None) and (self.lexer.lexdata is not None) :
+                rc = self.lexer.skip( types )
+                if self.lexer.skipped is not None :
+                    last = self.lexer.skipped
+                if rc :
+                    return
+
+# end of buffer or the scanner needs to make tokens: a few of them, from the next buffer if need be
+#
+            batch = self.tokens_batch( 16 )
+            if len( batch ) < 1 :
+                break
+            batch.reverse()
+            self._pushed = batch
 
-# if it's none again, we're done
+# dropped tokens are copies (PLY's too), this one is ours
 #
-            if rc is None : raise StopIteration
+        if last is not None :
+            last.type = "NL"
+            last.value = "\n"
+            self._pushed = [last]
+
+    #
+    #
+    def peek( self ) :
+        """returns the next token without taking it off the input, ``None`` at end of input"""
+
+        try :
+            token = self.next()
+        except StopIteration :
+            return None
+        self._pushed.append( token )
+        return token
+
+    #
+    #
+    def reset( self, fp = None ) :
+        """start over with new input: ``fp`` is the same as in the constructor.
+
+        Line numbers and lexical state are reset, the compiled lexer is kept: one ``StarLexer``
+        can read any number of files."""
 
-        assert hasattr( rc, "lineno" )
-        assert hasattr( rc, "type" )
-        assert hasattr( rc, "value" )
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + ".reset()\n" )
 
-        return rc
+        if self._reader is not None :
+            self._reader.close()
+        self._fp = fp
+        self._reader = None
+        self._tail = ""
+        self._pushed = []
+        self._error = None
+        if self._engine == "regex" :
+            self.lexer.reset()
+        else :
+            self.lexer.lexstatestack = []
+            self.lexer.begin( "INITIAL" )
+            self.lexer.lineno = 1
+            self.lexer.input( "" )
 
     #
     #
-    def send( self, lines ) :
-        """feed the next chunk of lines to the lexer.
+    def send( self, data ) :
+        """feed the next chunk of input to the lexer.
 
-        NOTE that they must be whole lines, or bad things will happen"""
+        The chunk can be cut anywhere, e.g. a fixed-size block from ``os.read()``: the text after
+        its last newline is held back and goes in front of the next chunk, so the lexer only ever
+        sees whole lines. Call ``flush()`` at the end of input to feed it the last partial line.
+        Read all tokens from one chunk before sending the next."""
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + ".send()\n" )
 
-        self.lexer.input( lines )
+        if len( self._tail ) > 0 :
+            data = self._tail + data
+        end = data.rfind( isinstance( data, bytes ) and b"\n" or "\n" ) + 1
+        self._tail = data[end:]
+        self._input( data[:end] )
+
+    #
+    #
+    def flush( self ) :
+        """end of input for ``send()``: feed the lexer what's left after the last newline"""
+
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + ".flush()\n" )
+
+        data = self._tail
+        self._tail = ""
+        self._input( data )
+
+#######################################################
+# building PLY lexer (reflection, rule validation, master regexps) is expensive.
+# do it once per class and PLY arguments, on a bare instance (so the template does not hold on
+# to anyone's input), and give every StarLexer a clone with the rules bound to it.
+#
+# to save the next process the trouble, the tables are also written to a module in the user's
+# cache directory (if we can) and read back from there: not to the package directory, that may be
+# read-only or shared by users running different versions. module name is a hash of the rules
+# (their regexps and order), so changing them makes new tables. that's only done without
+# user-specified PLY args.
+#
+_TEMPLATES = {}
+
+def _ply_lexer( obj, lexer_args ) :
+    """returns PLY lexer for ``StarLexer`` instance ``obj``"""
+    import ply.lex as lex
+    key = (obj.__class__, tuple( sorted( lexer_args.items() ) ))
+    lexer_args = dict( lexer_args )
+    lexer_args.setdefault( "reflags", _REFLAGS )
+    if key not in _TEMPLATES :
+        bare = object.__new__( obj.__class__ )
+        tab = None
+        if len( key[1] ) < 1 :
+            tabname = _lextab_name( obj.__class__ )
+            tab = _read_lextab( tabname )
+        if tab is not None :
+            _TEMPLATES[key] = lex.lex( module = bare, optimize = True, lextab = tab,
+                    errorlog = lex.NullLogger() )
+        else :
+            _TEMPLATES[key] = lex.lex( module = bare, errorlog = lex.NullLogger(), **lexer_args )
+            if len( key[1] ) < 1 :
+                _write_lextab( _TEMPLATES[key], tabname )
+
+# clone() is a shallow copy: the state stack is shared, and the current state's rules are the
+# template's until begin()
+#
+    rc = _TEMPLATES[key].clone( obj )
+    rc.lexstatestack = []
+    rc.begin( "INITIAL" )
+    return rc
+
+#
+#
+def _lextab_name( cls ) :
+    """table module name for lexer class ``cls``"""
+    rules = [cls.tokens, cls.states, _REFLAGS]
+    for name in sorted( dir( cls ) ) :
+        if not name.startswith( "t_" ) : continue
+        rule = getattr( cls, name )
+        if callable( rule ) :
+            rules.append( (name, rule.__doc__, rule.__code__.co_firstlineno) )
+        else :
+            rules.append( (name, rule) )
+    return "_lextab_" + hashlib.md5( repr( rules ).encode( "utf-8" ) ).hexdigest()[:16]
+
+#
+#
+def _cache_dir() :
+    """lexer table directory: ``$XDG_CACHE_HOME/sas``, ``%LOCALAPPDATA%\\sas`` on Windows,
+    else ``~/.cache/sas``"""
+    base = os.environ.get( "XDG_CACHE_HOME" )
+    if not base and sys.platform.startswith( "win" ) :
+        base = os.environ.get( "LOCALAPPDATA" )
+    if not base :
+        base = os.path.join( os.path.expanduser( "~" ), ".cache" )
+    return os.path.join( base, "sas" )
+
+# the table is executed, not imported: the cache directory isn't on ``sys.path``
+#
+def _read_lextab( name ) :
+    """returns table module or None"""
+    path = os.path.join( _cache_dir(), name + ".py" )
+    try :
+        with open( path ) as f :
+            code = compile( f.read(), path, "exec" )
+    except (IOError, OSError, SyntaxError) :
+        return None
+    tab = types.ModuleType( name )
+    exec( code, tab.__dict__ )
+    return tab
+
+# write to a temp. file and rename it over the old one, so no one reads it half-written. then
+# remove the tables of older rules: one set of rules, one table. if it can't be saved, say so
+# once: every process will have to build the lexer again.
+#
+_LEXTAB_RE = re.compile( r"^(_lextab_[0-9a-f]{16})\.py$" )
+_replace = getattr( os, "replace", os.rename )
+_lextab_warned = False
+
+def _write_lextab( lexobj, name ) :
+    global _lextab_warned
+    outdir = _cache_dir()
+    tmpname = "%s_%d" % (name, os.getpid())
+    try :
+        try :
+            os.makedirs( outdir )
+        except OSError :
+            if not os.path.isdir( outdir ) : raise
+        lexobj.writetab( tmpname, outdir )
+        _replace( os.path.join( outdir, tmpname + ".py" ), os.path.join( outdir, name + ".py" ) )
+    except (IOError, OSError) as e :
+        try :
+            os.remove( os.path.join( outdir, tmpname + ".py" ) )
+        except OSError :
+            pass
+        if not _lextab_warned :
+            _lextab_warned = True
+            sys.stderr.write( "can't save lexer tables in %s: %s\n" % (outdir, e) )
+        return
+    for f in os.listdir( outdir ) :
+        m = _LEXTAB_RE.match( f )
+        if (m is not None) and (m.group( 1 ) != name) :
+            try :
+                os.remove( os.path.join( outdir, f ) )
+            except OSError :
+                pass
+
+#######################################################
+# debug lexer
+#
+# the verbose lexer is a subclass of the same name that says what it's doing: ``next()`` calls,
+# and what ``t_`` rule matched what (PLY engine only: the rule name is the name of the matching
+# group in PLY's master regexp).
+#
+# it has PLY return whitespace tokens: the rules run either way, we need them for the trace.
+#
+_VERBOSE = {}
+
+class _VerboseLexer( object ) :
+    """mixin for ``StarLexer( verbose = True )``"""
+
+# one at a time: the trace is of the lexer's last match
+#
+    _batch = 1
+
+    _rules = {
+        "t_SPACE" : "Space in line %(line)d",
+        "t_ANY_ESQUOTE" : "Escaped single quote in line %(line)d",
+        "t_TSQUOTE" : "Opening 3xsingle quote in line %(line)d",
+        "t_YYTSINGLE_TSQUOTE" : "Closing 3xsingle quote in line %(line)d",
+        "t_YYTSINGLE_CHARACTERS" : "Line in triple-quotes (%(line)d): |%(text)s|",
+        "t_SINGLEVALUE" : "Single-quoted value in line %(line)d",
+        "t_SQUOTE" : "Opening single quote in line %(line)d",
+        "t_YYSINGLE_SQUOTE" : "Single quote in line %(line)d",
+        "t_YYDOUBLE_YYSEMI_SQUOTE" : "Single quote in line %(line)d",
+        "t_YYSINGLE_CHARACTERS" : "chars in single quotes in line %(line)d: |%(text)s",
+        "t_ANY_EDQUOTE" : "Escaped double quote in line %(line)d",
+        "t_TDQUOTE" : "Opening 3xdouble quote in line %(line)d",
+        "t_YYTDOUBLE_TDQUOTE" : "Closing 3xdouble quote in line %(line)d",
+        "t_YYTDOUBLE_CHARACTERS" : "Line in triple-double-quotes (%(line)d): |%(text)s|",
+        "t_DOUBLEVALUE" : "Double-quoted value in line %(line)d",
+        "t_DQUOTE" : "Opening double quote in line %(line)d",
+        "t_YYDOUBLE_DQUOTE" : "Double quote in line %(line)d",
+        "t_YYSINGLE_YYSEMI_DQUOTE" : "Double quote in line %(line)d",
+        "t_YYDOUBLE_CHARACTERS" : "chars in double quotes in line %(line)d: |%(text)s",
+        "t_SEMICOLON" : "Semicolon in line %(line)d",
+        "t_YYSEMI_SEMICOLON" : "Semicolon in YYSEMI line %(line)d",
+        "t_YYSINGLE_YYDOUBLE_SEMICOLON" : "Semicolon in quoted value in line %(line)d",
+        "t_YYSEMI_CHARACTERS" : "Line in semicolons (%(line)d): |%(text)s|",
+        "t_GLOBALSTART" : "%(name)s: Start global block in line %(line)d",
+        "t_DATASTART" : "%(name)s: Start data |%(text)s| in line %(line)d",
+        "t_SAVESTART" : "%(name)s: Start saveframe |%(text)s| in line %(line)d",
+        "t_SAVEEND" : "%(name)s: End saveframe in line %(line)d",
+        "t_LOOPSTART" : "%(name)s: Start loop in line %(line)d",
+        "t_STOP" : "%(name)s: End loop in line %(line)d",
+        "t_TAGNAME" : "%(name)s: Tag in line %(line)d: |%(text)s|",
+        "t_FRAMECODE" : "%(name)s: Framecode value in line %(line)d: |%(text)s|",
+        "t_CHARACTERS" : "%(name)s: Bareword value in line %(line)d: |%(text)s|",
+    }
+
+    def __init__( self, *args, **kwargs ) :
+        super( _VerboseLexer, self ).__init__( *args, **kwargs )
+        self._quiet = False
+        if self._engine == "ply" :
+            self._quiet = not self._whitespace
+            self._whitespace = True
+
+    def next( self ) :
+        """returns the next lexer token, with commentary"""
+        sys.stdout.write( self.__class__.__name__ + ".next()\n" )
+        if self._pushed :
+            return self._pushed.pop()
+        while True :
+            rc = super( _VerboseLexer, self ).next()
+            match = getattr( self.lexer, "lexmatch", None )
+            if match is None :
+                return rc
+            rule = match.lastgroup
+            if rule in self._rules :
+                sys.stdout.write( self._rules[rule] % { "name" : self.__class__.__name__,
+                    "line" : rc.lineno, "text" : match.group( rule ) } + "\n" )
+            if not (self._quiet and (rule in ("t_NL", "t_SPACE"))) :
+                return rc
+
+#
+#
+def _verbose_class( cls ) :
+    """debug variant of lexer class ``cls``"""
+    if issubclass( cls, _VerboseLexer ) :
+        return cls
+    if cls not in _VERBOSE :
+        _VERBOSE[cls] = type( cls )( cls.__name__, (_VerboseLexer, cls),
+                { "__module__" : cls.__module__, "__doc__" : cls.__doc__ } )
+    return _VERBOSE[cls]
 
 #
 #
@@ -698,20 +1223,32 @@ if __name__ == "__main__" :
 #    lex.runmain()
 
     iterator = True
-    if len( sys.argv ) > 1 :
-        if sys.argv[1] == "send" :
+    engine = "ply"
+    bulk = False
+    vectorize = False
+    for arg in sys.argv[1:] :
+        if arg == "send" :
             iterator = False
+        if arg == "regex" :
+            engine = "regex"
+        if arg == "bulk" :
+            engine = "regex"
+            bulk = True
+        if arg == "vectorize" :
+            engine = "regex"
+            vectorize = True
 
     if iterator :
-        with sas.timer( "lexer (iter)" ) :
-            l = StarLexer( fp = sys.stdin, bufsize = 0, verbose = True )
+        with sas.timer( "lexer (iter, %s)" % (engine,) ) :
+            l = StarLexer( fp = sys.stdin, verbose = True, engine = engine,
+                    bulk = bulk, vectorize = vectorize )
             for t in l :
 #                pprint.pprint( t )
                 pass
 
     else :
-        with sas.timer( "lexer (send)" ) :
-            l = StarLexer() #  verbose = True )
+        with sas.timer( "lexer (send, %s)" % (engine,) ) :
+            l = StarLexer( engine = engine, bulk = bulk, vectorize = vectorize ) #  verbose = True )
             for line in sys.stdin :
                 l.send( line )
                 for t in l :
@@ -7,8 +7,10 @@ import os
 #import pprint
 
 _UP = os.path.join( os.path.split( __file__ )[0], "../.." )
-sys.path.append( os.path.realpath( _UP ) )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
 import sas
+from sas.parsebase import VALUES, DELIMITERS, EOF
 
 # this parser returns data name(s) (tags)  and data value(s) in separate callbacks
 #
@@ -18,367 +20,86 @@ class Parser( sas.ParserBase ) :
     Parser for ``ContentHandler2`` interface, see ``handlers.py`` for details.
     """
 
-    # top-level parse does not return anything
+    # verbose parser prints saveframe tokens
     #
-    def _parse_file( self ) :
-        """Top (file) level parse"""
-        assert isinstance( self._lexer, sas.StarLexer )
-        assert isinstance( self._ch, sas.ContentHandler2 )
-        assert isinstance( self._eh, sas.ErrorHandler )
-
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_file()\n" )
-
-        try :
-            for token in self._lexer :
-
-                if token.type in ("NL", "SPACE" ) : continue
-
-                if token.type == "COMMENT" :
-                    if self._ch.comment( line = token.lineno, text = token.value ) :
-                        return
-                    continue
+    _trace_tokens = ("_parse_save",)
 
-                if token.type == "DATASTART" :
-                    if self._ch.startData( line = token.lineno, name = token.value ) :
-                        return
-                    self._data_name = token.value
-                    if self._parse_data() :
-                        return
-                    continue
+    _content_handler = sas.ContentHandler2
 
-                if self._eh.error( line = token.lineno, msg = "invalid token at file level: %s : %s" \
-                        % (token.type, token.value,) ) :
-                    return
-
-            else :
-                ln = -1
-                if "token" in locals() :
-                    ln = token.lineno
-                self._ch.endData( line = ln, name = self._data_name )
-                return
-
-        except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
-            return
-
-    # returns a stop sign: if true: stop parsing
+    # see ``ParserBase`` and NMR-STAR elements in ``__init__.py``
     #
-    def _parse_data( self ) :
-        """Parse data block"""
-        assert isinstance( self._lexer, sas.StarLexer )
-        assert isinstance( self._ch, sas.ContentHandler2 )
-        assert isinstance( self._eh, sas.ErrorHandler )
-
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_data()\n" )
-
-        try :
-            for token in self._lexer :
-
-                if token.type in ("NL", "SPACE" ) : continue
-
-                if token.type == "COMMENT" :
-                    if self._ch.comment( line = token.lineno, text = token.value ) :
-                        return True
-                    continue
-
-                if token.type == "SAVESTART" :
-                    if self._ch.startSaveframe( line = token.lineno, name = token.value ) :
-                        return True
-                    if self._parse_save( name = token.value ) :
-                        return True
-                    continue
-
-                if self._eh.error( line = token.lineno, msg = "invalid token in data block: %s : %s" \
-                        % (token.type, token.value,) ) :
-                    return True
-
-            else :
-                ln = -1
-                if "token" in locals() :
-                    ln = token.lineno
-                self._ch.endData( line = ln, name = self._data_name )
+    _grammar = {
+        "file" : {
+            "COMMENT"   : "_comment",
+            "DATASTART" : "_data_start",
+            EOF         : "_end_data"
+        },
+        "data" : {
+            "COMMENT"   : "_comment",
+            "SAVESTART" : "_save_start",
+            EOF         : "_end_data"
+        },
+        "save" : {
+            "COMMENT"   : "_comment",
+            "SAVEEND"   : "_save_end",
+            "LOOPSTART" : "_loop_start",
+            "TAGNAME"   : "_tag",
+            VALUES      : "_value",
+            DELIMITERS  : "_value_delimited",
+            EOF         : "_save_eof"
+        },
+        "loop" : {
+            "COMMENT"   : "_comment",
+            "STOP"      : "_loop_stop",
+            "TAGNAME"   : "_loop_tag_event",
+            VALUES      : "_loop_value_event",
+            DELIMITERS  : "_loop_delimited_event",
+            EOF         : "_loop_eof"
+        }
+    }
+
+    # values
+    #
+    def _value( self, token, st ) :
+        if not st.need_value :
+            if self._eh.error( line = token.lineno, msg = "value not expected here: %s" \
+                    % (token.value,) ) :
                 return True
-
-        except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+        if self._ch.value( line = token.lineno, val = token.value, delim = sas.TOKENS[token.type] ) :
             return True
+        st.need_value = False
 
-    # read a delimited value
-    # returns a pair: val, stop where stop is the sopt parsing sign
-    #
-    def _read_value( self, delimiter ) :
-        assert isinstance( self._lexer, sas.StarLexer )
-        assert delimiter in ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART")
-
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._read_value(%s)\n" % (delimiter,) )
-
-        stop = False
-        val = ""
-        try :
-            for token in self._lexer :
-
-                if delimiter in ("SINGLESTART","DOUBLESTART") :
-                    if token.type == "NL" :
-                        if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" % (val,) ) :
-                            stop = True
-                            break
-                        val += "\n"
-                        continue
-
-                if delimiter == "SINGLESTART" :
-                    if token.type == "SINGLEEND" :
-                        break
-
-                if delimiter == "DOUBLESTART" :
-                    if token.type == "DOUBLEEND" :
-                        break
-
-                if delimiter == "TSINGLESTART" :
-                    if token.type == "TSINGLEEND" :
-                        break
-
-                if delimiter == "TDOUBLESTART" :
-                    if token.type == "TDOUBLEEND" :
-                        break
-
-# assume that trailing \n is a part of the "\n;" delimiter and strip it off
-#
-                if delimiter == "SEMISTART" :
-                    if token.type == "SEMIEND" :
-                        if val.endswith( "\n" ) : val = val.rstrip( "\n" )
-                        break
-
-                if not delimiter in ("SINGLESTART","DOUBLESTART") :
-                    for pat in sas.KEYWORDS :
-                        m = pat.search( token.value.strip() )
-                        if m :
-                            if self._eh.warning( line = token.lineno, msg = "keyword in value: %s" \
-                                    % (m.group( 1 ),) ) :
-                                stop = True
-                            break
-
-                val += token.value
-
-            else :
-                ln = -1
-                if "token" in locals() :
-                    ln = token.lineno
-                self._eh.fatalError( line = ln, msg = "EOF in delimited value" )
-                stop = True
-
-        except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
-            stop = True
-
-        return (val, stop)
-
-    # returns a stop sign: if true: stop parsing
-    #
-    def _parse_save( self, name ) :
-        """Parse saveframe"""
-        assert isinstance( self._lexer, sas.StarLexer )
-        assert isinstance( self._ch, sas.ContentHandler2 )
-        assert isinstance( self._eh, sas.ErrorHandler )
-
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_save(%s)\n" % (name,) )
-
-        need_value = False
-
-        try :
-            for token in self._lexer :
-
-                if self._verbose : sys.stdout.write( "> token: %s\n" % (token,) )
-
-                if token.type in ("NL", "SPACE" ) : continue
-
-                if token.type == "COMMENT" :
-                    if self._ch.comment( line = token.lineno, text = token.value ) :
-                        return True
-                    continue
-
-#                print ">"
-
-# exit point
-#
-                if token.type == "SAVEEND" :
-                    if need_value :
-                        if self._eh.error( line = token.lineno, msg = "found save_, expected value" ) :
-                            return True
-                    if self._ch.endSaveframe( line = token.lineno, name = name ) :
-                        return True
-                    return False
-
-#                print ">>"
-
-                if token.type == "LOOPSTART" :
-                    if need_value :
-                        if self._eh.error( line = token.lineno, msg = "found loop_, expected value" ) :
-                            return True
-                    if self._ch.startLoop( line = token.lineno ) :
-                        return True
-                    if self._parse_loop() :
-                        return True
-                    continue
-
-#                print ">>>"
-
-                if token.type == "TAGNAME" :
-                    if need_value :
-                        if self._eh.error( line = token.lineno, msg = "found tag: %s, expected value" \
-                                % (token.value,) ) :
-                            return True
-                        print "Calling self._ch.tag"
-                    if self._ch.tag( line = token.lineno, tag = token.value ) :
-                        return True
-                    need_value = True
-                    continue
-
-#                print ">>>>"
-
-                if token.type in ("CHARACTERS","FRAMECODE") :
-                    if not need_value :
-                        if self._eh.error( line = token.lineno, msg = "value not expected here: %s" \
-                                % (token.value,) ) :
-                            return True
-                    if self._ch.value( line = token.lineno, val = token.value, delim = sas.TOKENS[token.type] ) :
-                        return True
-                    need_value = False
-                    continue
-
-#                print ">>>>>"
-
-                if token.type in ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART") :
-                    if not need_value :
-                        if self._eh.error( line = token.lineno, msg = "value not expected here (found delimiter)" ) :
-                            return True
-                    (val, stop) = self._read_value( token.type )
-                    if stop :
-                        return True
-                    if self._ch.value( line = token.lineno, val = val, delim = sas.TOKENS[token.type] ) :
-                        return True
-                    need_value = False
-                    continue
-
-#                print ">>>>>>"
-
-                if self._eh.error( line = token.lineno, msg = "invalid token in saveframe: %s : %s" \
-                        % (token.type, token.value,) ) :
-                    return True
-
-            else :
-                ln = -1
-                if "token" in locals() :
-                    ln = token.lineno
-                if need_value :
-                    self._eh.fatalError( line = ln, msg = "EOF in saveframe: %s (expected value)" \
-                        % (name,) )
-                    return True
-                self._eh.fatalError( line = ln, msg = "EOF in saveframe: %s (no closing save_)" % (name,) )
+    def _value_delimited( self, token, st ) :
+        if not st.need_value :
+            if self._eh.error( line = token.lineno, msg = "value not expected here (found delimiter)" ) :
                 return True
-
-        except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+        (val, stop) = self._read_value( token.type )
+        if stop :
+            return True
+        if self._ch.value( line = token.lineno, val = val, delim = sas.TOKENS[token.type] ) :
             return True
+        st.need_value = False
 
-    # returns a stop sign: if true: stop parsing
+    # loop values: tags are not matched to them here
     #
-    def _parse_loop( self ) :
-        """Parse loop"""
-        assert isinstance( self._lexer, sas.StarLexer )
-        assert isinstance( self._ch, sas.ContentHandler2 )
-        assert isinstance( self._eh, sas.ErrorHandler )
-
-        if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_loop()\n" )
-
-        need_tag = True
-        numtags = 0
-        numvals = 0
-
-        try :
-            for token in self._lexer :
-
-                if token.type in ("NL", "SPACE" ) : continue
-
-                if token.type == "COMMENT" :
-                    if self._ch.comment( line = token.lineno, text = token.value ) :
-                        return True
-                    continue
-
-# exit point
-#
-                if token.type == "STOP" :
-                    if numtags < 1 :
-                        if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
-                            return True
-                    if numvals < 1 :
-                        if self._eh.error( line = token.lineno, msg = "Loop with no values" ) :
-                            return True
-                    if (numvals % numtags) != 0 :
-                        if self._eh.error( line = token.lineno, msg = "Loop count error" ) :
-                            return True
-
-                    if self._ch.endLoop( line = token.lineno ) :
-                        return True
-                    return False
-
-                if token.type == "TAGNAME" :
-                    if not need_tag :
-                        if self._eh.error( line = token.lineno, msg = "tag not expected here: %s" \
-                                % (token.value,) ) :
-                            return True
-                    numtags += 1
-                    if self._ch.tag( line = token.lineno, tag = token.value ) :
-                        return True
-                    continue
-
-                if token.type in ("CHARACTERS","FRAMECODE") :
-                    if need_tag :
-                        need_tag = False
-                    if numtags < 1 :
-                        if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
-                            return True
-                    numvals += 1
-                    if self._ch.value( line = token.lineno, val = token.value, delim = sas.TOKENS[token.type] ) :
-                        return True
-                    continue
-
-                if token.type in ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART") :
-                    if need_tag :
-                        need_tag = False
-                    if numtags < 1 :
-                        if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
-                            return True
-                    numvals += 1
-                    (val, stop) = self._read_value( token.type )
-                    if stop : return True
-
-                    if self._ch.value( line = token.lineno, val = val, delim = sas.TOKENS[token.type] ) :
-                        return True
-                    continue
-
-                if self._eh.error( line = token.lineno, msg = "invalid token in loop: %s : %s" \
-                        % (token.type, token.value,) ) :
-                    return True
-
-            else :
-                ln = -1
-                if "token" in locals() :
-                    ln = token.lineno
-                if numtags < 1 :
-                    self._eh.fatalRrror( line = ln, msg = "EOF in loop (no tags)" )
-                    return True
-                if numvals < 1 :
-                    self._eh.fatalError( line = ln, msg = "EOF in loop (no values)" )
-                    return True
-
-                if (numvals % numtags ) != 0 :
-                    self._eh.error( line = ln, msg = "Loop count error" )
-
-                self._eh.fatalError( line = ln, msg = "EOF in loop (no closing stop_)" )
+    def _loop_value_event( self, token, st ) :
+        st.header = False
+        if len( st.tags ) < 1 :
+            if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
                 return True
+        st.numvals += 1
+        if self._ch.value( line = token.lineno, val = token.value, delim = sas.TOKENS[token.type] ) :
+            return True
 
-        except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+    def _loop_delimited_event( self, token, st ) :
+        st.header = False
+        if len( st.tags ) < 1 :
+            if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
+                return True
+        st.numvals += 1
+        (val, stop) = self._read_value( token.type )
+        if stop : return True
+        if self._ch.value( line = token.lineno, val = val, delim = sas.TOKENS[token.type] ) :
             return True
 
 ###################################################################################################
@@ -423,7 +144,7 @@ if __name__ == "__main__" :
 
     e = sas.ErrorHandler()
     c = Ch( verbose = False )
-    l = sas.StarLexer( fp = sys.stdin, bufsize = 0, verbose = False )
+    l = sas.StarLexer( fp = sys.stdin, verbose = False )
     with sas.timer( "SANS2" ) :
         p = Parser.parse( lexer = l, content_handler = c, error_handler = e, verbose = False )
 
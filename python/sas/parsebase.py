@@ -9,22 +9,143 @@ import abc
 #import pprint
 
 _UP = os.path.join( os.path.split( __file__ )[0], ".." )
-sys.path.append( os.path.realpath( _UP ) )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
 import sas
 
+try :
+    basestring
+except NameError :
+    basestring = str
+
+# abstract base: python 3 ignores ``__metaclass__``, this works in both
+#
+_Abstract = abc.ABCMeta( "_Abstract", (object,), {} )
+
+# token classes and end of input: grammar table keys
+#
+VALUES = ("CHARACTERS","FRAMECODE","SINGLEVALUE","DOUBLEVALUE")
+DELIMITERS = ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART")
+CLOSINGS = ("SINGLEEND","TSINGLEEND","DOUBLEEND","TDOUBLEEND","SEMIEND")
+EOF = "EOF"
+OTHER = None
+
+# closing token for each opening delimiter
+#
+_CLOSING = dict( zip( DELIMITERS, CLOSINGS ) )
+
+# for "invalid token" errors
+#
+_WHERE = { "file" : "at file level", "data" : "in data block", "save" : "in saveframe", "loop" : "in loop" }
+
+# keyword as it is in the input (lexer strips "data_" and "save_" off block names)
+#
+_KEYWORDS = { "DATASTART" : "data_", "SAVESTART" : "save_" }
+
+def _keyword( token ) :
+    return _KEYWORDS.get( token.type, "" ) + token.value.strip()
+
+def _line( token, line = -1 ) :
+    """line number of the last token at EOF, ``line`` if there were none (without whitespace
+    tokens a context may have read none: then it's the line the context started on)"""
+    if token is None :
+        return line
+    return token.lineno
+
+# what a context knows about the tokens it has read
+#
+class _State( object ) :
+    __slots__ = ("context", "name", "need_value", "last_tag", "header", "tags", "tag_idx", "numvals",
+            "delimiter", "row", "rows", "rowline", "skip", "line")
+    def __init__( self, context, name = None, line = -1 ) :
+        self.context = context
+        self.name = name
+        self.line = line
+        self.need_value = False
+        self.last_tag = None
+        self.header = True
+        self.tags = []
+        self.tag_idx = -1
+        self.numvals = 0
+        self.delimiter = None
+        self.row = []
+        self.rows = []
+        self.rowline = -1
+        self.skip = False
+
+# grammar tables of each parser class compiled to dispatch tables, see ``ParserBase._parse()``
+#
+_TABLES = {}
+
+def _tables( cls ) :
+    """returns { context : { token type : action function } } for parser class ``cls``"""
+    if cls not in _TABLES :
+        tables = {}
+        for (context, grammar) in cls._grammar.items() :
+            table = { "NL" : None, "SPACE" : None, OTHER : _function( cls, "_invalid" ) }
+            for (types, name) in grammar.items() :
+                if not isinstance( types, tuple ) :
+                    types = (types,)
+                for t in types :
+                    table[t] = _function( cls, name )
+            tables[context] = table
+        _TABLES[cls] = tables
+    return _TABLES[cls]
+
+def _function( cls, name ) :
+    """method ``name`` of ``cls`` as a plain function (python 2 has unbound methods)"""
+    method = getattr( cls, name )
+    return getattr( method, "__func__", method )
+
 # base interface for SAS parsers
 #
-class ParserBase( object ) :
+class ParserBase( _Abstract ) :
 
     """
     Parser for STAR file.
+
+    The parse engine is shared by all dialects. A dialect is a ``_grammar``: for each context
+    ("file", "data", "save", "loop") a table of token type (or a tuple of types, or ``EOF``) to
+    the name of the method that handles it. NL and SPACE tokens are skipped, any other token not
+    in the table (``OTHER``) is an "invalid token" error. ``_parse()`` looks up the method for each token in
+    a dispatch table made from the grammar once per class.
+
+    A method is called with the token and the context's ``_State``. It returns ``None`` to keep
+    going, or the value the context returns: ``True`` to stop parsing, ``False`` when the context
+    ends. The methods below implement both callback policies: ``ContentHandler`` (``data()`` with
+    tag and value) and ``ContentHandler2`` (separate ``tag()`` and ``value()``). Dialects override
+    the ones they do differently.
     """
 
-    __metaclass__ = abc.ABCMeta
+    # context -> { token type(s) : method name }
+    #
+    _grammar = {}
+
+    # content handler interface the parser calls
+    #
+    _content_handler = sas.ContentHandlerBase
 
+    # tokens read in these methods are printed by the verbose parser, see _trace_token()
     #
+    _trace_tokens = ()
+
+    # ``verbose = True`` makes an instance of the debug subclass: parse methods
+    # have no tracing branches in them. Same for ``RowContentHandler``: its parser is a subclass
+    # that collects loop rows, and for ``wanted``: a subclass that skips what isn't.
+    #
+    def __new__( cls, *args, **kwargs ) :
+        ch = kwargs.get( "ch", (len( args ) > 1) and args[1] or None )
+        if isinstance( ch, sas.RowContentHandler ) and issubclass( sas.RowContentHandler, cls._content_handler ) :
+            cls = _row_class( cls )
+        if kwargs.get( "wanted", args[4] if len( args ) > 4 else None ) is not None :
+            cls = _projected_class( cls )
+        if kwargs.get( "verbose", (len( args ) > 3) and args[3] ) :
+            cls = _verbose_class( cls )
+        return object.__new__( cls )
+
     #
-    def __init__( self, lex, ch, eh, verbose = False ) :
+    #
+    def __init__( self, lex, ch, eh, verbose = False, wanted = None ) :
         """
         constructor
 
@@ -32,17 +153,28 @@ class ParserBase( object ) :
         ``ch`` : ``sas.ContentHandlerBase``
         ``eh`` : ``sas.ErrorHandler``
         ``verbose`` flag is optional
+        ``wanted``: optional (``ContentHandler`` parsers only) tags, tag categories and saveframe
+                    categories, e.g. ``("_Entity.Name", "_Entity_poly_seq", "assigned_chemical_shifts")``.
+                    Only the data items and loops that have a wanted tag, a tag in a wanted
+                    category, or are in a saveframe of wanted category go to the content
+                    handler. The rest is skipped by the lexer without making value tokens,
+                    see ``_ProjectedParser``. Syntax errors and comments in skipped input
+                    are not reported, so input that fails a full parse may pass this one.
         """
 
         assert isinstance( lex, sas.StarLexer )
         assert isinstance( ch, sas.ContentHandlerBase )
         assert isinstance( eh, sas.ErrorHandler )
+        assert (wanted is None) or issubclass( self._content_handler, sas.ContentHandler )
         self._lexer = lex
         self._ch = ch
         self._eh = eh
         self._verbose = bool( verbose )
         self._data_name = "__FILE__"
         self._save_name = "__UNNAMED__"
+        self._tables = _tables( self.__class__ )
+        (self._wanted, self._sf_categories) = _projection( wanted )
+        self._sf_wanted = False
 
     #
     #
@@ -53,26 +185,750 @@ class ParserBase( object ) :
     @verbose.setter
     def verbose( self, flag ) :
         self._verbose = bool( flag )
+        if self._verbose :
+            self.__class__ = _verbose_class( self.__class__ )
+        elif issubclass( self.__class__, _VerboseParser ) :
+            self.__class__ = self.__class__.__mro__[2]
+
+    # print a token read in one of the ``_trace_tokens`` methods (verbose parser only)
+    #
+    def _trace_token( self, method, token ) :
+        sys.stdout.write( "> token: %s\n" % (token,) )
 
     # main
     #
     @classmethod
-    def parse( cls, lexer, content_handler, error_handler, verbose = False ) :
+    def parse( cls, lexer, content_handler, error_handler, verbose = False, wanted = None ) :
         """
         Main method
 
-        parameters are the same as for the contructor
+        parameters are the same as for the contructor, except ``lexer`` can also be a file name
+        or a file-like object: it is read by a default ``StarLexer`` (a file is memory-mapped,
+        compressed input is decompressed).
 
         returns parser instance
         """
-        parser = cls( lex = lexer, ch = content_handler, eh = error_handler, verbose = verbose )
+        if isinstance( lexer, basestring ) or hasattr( lexer, "read" ) :
+            lexer = sas.StarLexer( fp = lexer )
+        parser = cls( lex = lexer, ch = content_handler, eh = error_handler, verbose = verbose,
+            wanted = wanted )
         assert isinstance( parser, ParserBase )
-        parser._parse_file()
+        parser.run()
         return parser
 
-    @abc.abstractmethod
-    def _parse_file() :
-        raise Exception( "Abstract method called" )
+    # reuse
+    #
+    def reset( self, fp = None ) :
+        """
+        Start over with new input
+
+        ``fp`` is passed to ``StarLexer.reset()``: a file, a file name, or ``None`` to ``send()``
+        input to the lexer. Handlers are kept.
+
+        returns parser instance, call ``run()`` to parse
+        """
+        self._lexer.reset( fp )
+        self._data_name = "__FILE__"
+        self._save_name = "__UNNAMED__"
+        self._sf_wanted = False
+        return self
+
+    def run( self ) :
+        """parse the input, e.g. ``parser.reset( fp ).run()``. returns parser instance"""
+        self._parse_file()
+        return self
+
+    ###############################################################################################
+    # parse engine
+    #
+    def _parse( self, state ) :
+        """read tokens in ``state.context`` until a method returns stop sign or end of context"""
+        table = self._tables[state.context]
+        other = table[OTHER]
+        token = None
+        try :
+            for token in self._lexer :
+                action = table.get( token.type, other )
+                if action is None : continue
+                rc = action( self, token, state )
+                if rc is not None :
+                    return rc
+            return table[EOF]( self, token, state )
+
+        except sas.SasException as e :
+            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            return True
+
+    # top-level parse does not return anything
+    #
+    def _parse_file( self ) :
+        """Top (file) level parse"""
+        assert isinstance( self._ch, self._content_handler )
+        self._parse( _State( "file" ) )
+
+    # returns a stop sign: if true: stop parsing
+    #
+    def _parse_data( self, line ) :
+        """Parse data block that starts on ``line``"""
+        return self._parse( _State( "data", line = line ) )
+
+    def _parse_save( self, name, line ) :
+        """Parse saveframe"""
+        return self._parse( _State( "save", name, line ) )
+
+    def _parse_loop( self, line ) :
+        """Parse loop"""
+        return self._parse( _State( "loop", line = line ) )
+
+    # read a delimited value
+    # returns a pair: val, stop where stop is the "stop parsing" sign
+    #
+    # value is joined once at the end and checked for keywords in one pass: adding to a string
+    # token by token is quadratic in the size of the value (embedded files in semicolon values).
+    #
+    def _read_value( self, delimiter ) :
+        closing = _CLOSING[delimiter]
+        quoted = delimiter in ("SINGLESTART","DOUBLESTART")
+
+        parts = []
+        line = -1
+        try :
+            token = None
+            for token in self._lexer :
+
+                if quoted and (token.type == "NL") :
+                    if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" \
+                            % ("".join( parts ),) ) :
+                        return ("".join( parts ), True)
+                    parts.append( "\n" )
+                    continue
+
+                if token.type == closing :
+                    break
+
+                if line < 0 :
+                    line = token.lineno
+                parts.append( token.value )
+
+            else :
+                val = "".join( parts )
+                if not quoted :
+                    self._keywords_in_value( val, line )
+                self._eh.fatalError( line = _line( token ), msg = "EOF in delimited value" )
+                return (val, True)
+
+        except sas.SasException as e :
+            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            return ("".join( parts ), True)
+
+        val = "".join( parts )
+
+# assume that trailing \n is a part of the "\n;" delimiter and strip it off
+#
+        if delimiter == "SEMISTART" :
+            val = val.rstrip( "\n" )
+        if quoted :
+            return (val, False)
+        return (val, self._keywords_in_value( val, line ))
+
+    # warn about keywords in value that starts in ``line``. returns stop sign
+    #
+    def _keywords_in_value( self, val, line ) :
+        stop = False
+        for (ln, kw) in sas.find_keywords( val, line ) :
+            if self._eh.warning( line = ln, msg = "keyword in value: %s" % (kw,) ) :
+                stop = True
+        return stop
+
+    ###############################################################################################
+    # grammar methods: ``( token, state )``, return None to keep going
+    #
+    def _invalid( self, token, st ) :
+        if self._eh.error( line = token.lineno, msg = "invalid token %s: %s : %s" \
+                % (_WHERE[st.context], token.type, token.value,) ) :
+            return True
+
+    def _comment( self, token, st ) :
+        if self._ch.comment( line = token.lineno, text = token.value ) :
+            return True
+
+    def _data_start( self, token, st ) :
+        if self._ch.startData( line = token.lineno, name = token.value ) :
+            return True
+        self._data_name = token.value
+        if self._parse_data( token.lineno ) :
+            return True
+
+    def _save_start( self, token, st ) :
+        if st.need_value :
+            if self._eh.error( line = token.lineno, msg = "found save_%s, expected value" \
+                    % (token.value,) ) :
+                return True
+        if self._ch.startSaveframe( line = token.lineno, name = token.value ) :
+            return True
+        self._save_name = token.value
+        if self._parse_save( name = token.value, line = token.lineno ) :
+            return True
+
+# exit point
+#
+    def _save_end( self, token, st ) :
+        if st.need_value :
+            if self._eh.error( line = token.lineno, msg = "found save_, expected value" ) :
+                return True
+        if self._ch.endSaveframe( line = token.lineno, name = self._save_name ) :
+            return True
+        self._save_name = "__UNNAMED__"
+        return False
+
+    def _loop_start( self, token, st ) :
+        if st.need_value :
+            if self._eh.error( line = token.lineno, msg = "found loop_, expected value" ) :
+                return True
+        if self._ch.startLoop( line = token.lineno ) :
+            return True
+        if self._parse_loop( token.lineno ) :
+            return True
+
+# data items: ``ContentHandler`` gets tag and value in one callback
+#
+    def _item_tag( self, token, st ) :
+        if st.need_value :
+            if self._eh.error( line = token.lineno, msg = "found tag: %s, expected value" \
+                    % (token.value,) ) :
+                return True
+        st.last_tag = (token.value,token.lineno)
+        st.need_value = True
+
+    def _item_value( self, token, st ) :
+        if not st.need_value :
+            if self._eh.error( line = token.lineno, msg = "value not expected here: %s" \
+                    % (token.value,) ) :
+                return True
+        assert isinstance( st.last_tag, tuple )
+        if self._ch.data( tag = st.last_tag[0], tagline = st.last_tag[1], val = token.value,
+                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+            return True
+        st.need_value = False
+
+    def _item_delimited( self, token, st ) :
+        if not st.need_value :
+            if self._eh.error( line = token.lineno, msg = "value not expected here (found delimiter)" ) :
+                return True
+        assert isinstance( st.last_tag, tuple )
+        (val, stop) = self._read_value( token.type )
+        if stop : return True
+        if self._ch.data( tag = st.last_tag[0], tagline = st.last_tag[1], val = val,
+                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+            return True
+        st.need_value = False
+
+# loops: tags, then values matched to them. (no tags is an error, if it's ignored the values go
+# under a made-up tag.)
+#
+    def _loop_tag( self, token, st ) :
+        if not st.header :
+            if self._eh.error( line = token.lineno, msg = "tag not expected here: %s" \
+                    % (token.value,) ) :
+                return True
+        st.tags.append( (token.value,token.lineno) )
+
+    def _first_value( self, token, st ) :
+        """first value after tags: returns stop sign"""
+        st.header = False
+        if len( st.tags ) < 1 :
+            if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
+                return True
+            st.tags.append( ("LOOP_WITH_NO_TAGS",token.lineno) )
+        return False
+
+    def _loop_value( self, token, st ) :
+        if st.header :
+            if self._first_value( token, st ) :
+                return True
+        st.numvals += 1
+        st.tag_idx += 1
+        if st.tag_idx >= len( st.tags ) :
+            st.tag_idx = 0
+        tag = st.tags[st.tag_idx]
+        if self._ch.data( tag = tag[0], tagline = tag[1], val = token.value,
+                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
+            return True
+
+    def _loop_delimited( self, token, st ) :
+        if st.header :
+            if self._first_value( token, st ) :
+                return True
+        st.numvals += 1
+        st.tag_idx += 1
+        if st.tag_idx >= len( st.tags ) :
+            st.tag_idx = 0
+        (val, stop) = self._read_value( token.type )
+        if stop : return True
+        tag = st.tags[st.tag_idx]
+        if self._ch.data( tag = tag[0], tagline = tag[1], val = val,
+                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
+            return True
+
+# tags and values: ``ContentHandler2`` and ``SasContentHandler`` get separate callbacks
+#
+    def _tag( self, token, st ) :
+        if st.need_value :
+            if self._eh.error( line = token.lineno, msg = "found tag: %s, expected value" \
+                    % (token.value,) ) :
+                return True
+        if self._ch.tag( line = token.lineno, tag = token.value ) :
+            return True
+        st.need_value = True
+
+    def _loop_tag_event( self, token, st ) :
+        if not st.header :
+            if self._eh.error( line = token.lineno, msg = "tag not expected here: %s" \
+                    % (token.value,) ) :
+                return True
+        st.tags.append( (token.value,token.lineno) )
+        if self._ch.tag( line = token.lineno, tag = token.value ) :
+            return True
+
+# loop ends: with ``stop_`` (NMR-STAR), or implicitly with the next keyword or tag (mmCIF, DDL)
+#
+    def _end_loop( self, line, st ) :
+        """``endLoop()`` callback: returns stop sign"""
+        return self._ch.endLoop( line = line )
+
+    def _flush_rows( self, st ) :
+        """pass on the values collected so far (``RowContentHandler``), before the loop's errors
+        are reported: returns stop sign"""
+        return False
+
+    def _loop_errors( self, line, st ) :
+        """tag and value count checks: returns stop sign"""
+        if self._flush_rows( st ) :
+            return True
+        if len( st.tags ) < 1 :
+            if self._eh.error( line = line, msg = "Loop with no tags" ) :
+                return True
+        if st.numvals < 1 :
+            if self._eh.error( line = line, msg = "Loop with no values" ) :
+                return True
+        if (len( st.tags ) > 0) and ((st.numvals % len( st.tags )) != 0) :
+            if self._eh.error( line = line, msg = "Loop count error" ) :
+                return True
+        return False
+
+    def _loop_stop( self, token, st ) :
+        if self._loop_errors( token.lineno, st ) :
+            return True
+        if self._end_loop( token.lineno, st ) :
+            return True
+        return False
+
+# push back the token to re-trigger in the caller
+#
+    def _loop_implicit_end( self, token, st ) :
+        if self._flush_rows( st ) :
+            return True
+        if st.header :
+            if len( st.tags ) < 1 :
+                if self._eh.error( line = token.lineno, msg = "Loop with no tags" ) :
+                    return True
+            if self._eh.error( line = token.lineno, msg = "found %s, expected value" % (_keyword( token ),) ) :
+                return True
+        elif (st.numvals % len( st.tags )) != 0 :
+            if self._eh.error( line = token.lineno, msg = "Loop count error" ) :
+                return True
+        if self._end_loop( token.lineno, st ) :
+            return True
+        self._lexer.push_back( token )
+        return False
+
+    def _loop_tag_or_end( self, token, st ) :
+        if st.header :
+            st.tags.append( (token.value,token.lineno) )
+            return None
+        if self._flush_rows( st ) :
+            return True
+        if (st.numvals % len( st.tags )) != 0 :
+            if self._eh.error( line = token.lineno, msg = "Loop count error" ) :
+                return True
+        if self._end_loop( token.lineno, st ) :
+            return True
+        self._lexer.push_back( token )
+        return False
+
+# EOF
+#
+    def _end_data( self, token, st ) :
+        self._ch.endData( line = _line( token, st.line ), name = self._data_name )
+        return True
+
+    def _items_eof( self, token, st ) :
+        if st.need_value :
+            self._eh.fatalError( line = _line( token, st.line ), msg = "premature EOF, expected value" )
+            return True
+        return self._end_data( token, st )
+
+    def _save_eof( self, token, st ) :
+        if st.need_value :
+            self._eh.fatalError( line = _line( token, st.line ), msg = "EOF in saveframe: %s (expected value)" \
+                % (st.name,) )
+            return True
+        self._eh.fatalError( line = _line( token, st.line ), msg = "EOF in saveframe: %s (no closing save_)" \
+            % (st.name,) )
+        return True
+
+    def _loop_eof( self, token, st ) :
+        ln = _line( token, st.line )
+        if self._flush_rows( st ) :
+            return True
+        if len( st.tags ) < 1 :
+            self._eh.fatalError( line = ln, msg = "EOF in loop (no tags)" )
+            return True
+        if st.numvals < 1 :
+            self._eh.fatalError( line = ln, msg = "EOF in loop (no values)" )
+            return True
+        if (st.numvals % len( st.tags )) != 0 :
+            self._eh.error( line = ln, msg = "Loop count error" )
+        self._eh.fatalError( line = ln, msg = "EOF in loop (no closing stop_)" )
+        return True
+
+    def _implicit_loop_eof( self, token, st ) :
+        ln = _line( token, st.line )
+        if self._loop_errors( ln, st ) :
+            return True
+        if self._end_loop( ln, st ) :
+            return True
+
+# we may be in a saveframe
+#
+        if self._save_name != "__UNNAMED__" :
+            self._eh.fatalError( line = ln, msg = "Premature EOF (no closing save_)" )
+            return True
+        return self._end_data( token, st )
+
+###################################################################################################
+# row parsers
+#
+# parser for ``RowContentHandler`` is a subclass of the same name with loop value methods that
+# collect rows instead of calling ``data()``. Rows are passed on in batches of ``batch`` rows,
+# and what's left at the end of loop before ``endLoop()``.
+#
+_ROWS = {}
+
+_SPACE = frozenset( ("NL", "SPACE") )
+_BARE = frozenset( VALUES )
+
+class _RowParser( object ) :
+    """mixin for ``RowContentHandler`` parsers"""
+
+    def _row_header( self, token, st ) :
+        """first value after tags: returns stop sign"""
+        if self._first_value( token, st ) :
+            return True
+        return self._ch.loopHeader( line = st.tags[0][1], tags = [t[0] for t in st.tags] )
+
+    # add a value to the current row and read the bare values that follow it here, without going
+    # through the dispatch table. anything else is pushed back for ``_parse()``.
+    #
+    def _row_values( self, val, token, st ) :
+        """returns stop sign or None"""
+        width = len( st.tags )
+        batch = self._ch.batch
+        row = st.row
+        rows = st.rows
+        numvals = st.numvals - len( row ) - len( rows ) * width
+        if len( rows ) < 1 :
+            if len( row ) < 1 :
+                st.rowline = token.lineno
+        row.append( val )
+        if len( row ) >= width :
+            rows.append( row )
+            row = st.row = []
+
+        lexer = self._lexer
+        for token in lexer :
+            if len( rows ) >= batch :
+                st.numvals = numvals + len( rows ) * width
+                numvals = st.numvals
+                if self._flush_rows( st ) :
+                    return True
+                rows = st.rows
+            if token.type in _SPACE :
+                continue
+            if token.type not in _BARE :
+                lexer.push_back( token )
+                break
+            if not row :
+                if not rows :
+                    st.rowline = token.lineno
+            row.append( token.value )
+            if len( row ) >= width :
+                rows.append( row )
+                row = st.row = []
+
+        else :
+            st.numvals = numvals + len( rows ) * width + len( row )
+            return self._tables[st.context][EOF]( self, token, st )
+
+        st.numvals = numvals + len( rows ) * width + len( row )
+        if len( rows ) >= batch :
+            return self._flush_rows( st ) or None
+        return None
+
+    def _flush_rows( self, st ) :
+        """pass on collected rows (and a short row at the end of loop): returns stop sign"""
+        rows = st.rows
+        if len( st.row ) > 0 :
+            rows.append( st.row )
+            st.row = []
+        if len( rows ) < 1 :
+            return False
+        st.rows = []
+        return self._ch.rows( line = st.rowline, rows = rows )
+
+    def _loop_value( self, token, st ) :
+        if st.header :
+            if self._row_header( token, st ) :
+                return True
+        return self._row_values( token.value, token, st )
+
+    def _loop_delimited( self, token, st ) :
+        if st.header :
+            if self._row_header( token, st ) :
+                return True
+        (val, stop) = self._read_value( token.type )
+        if stop : return True
+        return self._row_values( val, token, st )
+
+    def _end_loop( self, line, st ) :
+        if self._flush_rows( st ) :
+            return True
+        return self._ch.endLoop( line = line )
+
+#
+#
+def _row_class( cls ) :
+    """``RowContentHandler`` variant of parser class ``cls``"""
+    if issubclass( cls, _RowParser ) :
+        return cls
+    if cls not in _ROWS :
+        attrs = { "__module__" : cls.__module__, "__doc__" : cls.__doc__ }
+        _ROWS[cls] = type( cls )( cls.__name__, (_RowParser, cls), attrs )
+    return _ROWS[cls]
+
+###################################################################################################
+# projection
+#
+# parser with ``wanted`` tags is a subclass of the same name that checks tags before it reads
+# the values. An unwanted data item's value, and an unwanted loop's values after the first one,
+# are skipped by ``StarLexer.skip()``: to the next tag or keyword, or to the end of loop.
+# A saveframe whose category is not wanted is skipped to its end if no tags or tag categories
+# are wanted: its category is the value of ``_Saveframe_category`` (NMR-STAR 2.1) or
+# ``_<category>.Sf_category`` (3.x), the first tag in the saveframe.
+#
+# Handlers still get ``start/endSaveframe()`` and ``start/endLoop()`` for what isn't skipped whole.
+# Comments and errors in skipped input are not reported. ``endData()`` and EOF errors still get
+# the line of the last token in the input: at end of input ``StarLexer.skip()`` passes on the
+# last one it skipped as an NL token.
+#
+_PROJECTED = {}
+
+_ITEM_ENDS = frozenset( ("TAGNAME", "LOOPSTART", "SAVESTART", "SAVEEND", "DATASTART", "GLOBALSTART") )
+_LOOP_ENDS = _ITEM_ENDS | frozenset( ("STOP",) )
+_SAVE_ENDS = frozenset( ("SAVESTART", "SAVEEND", "DATASTART", "GLOBALSTART") )
+
+def _projection( wanted ) :
+    """(tags and tag categories, saveframe categories) in ``wanted``. A tag with no "." is its own
+    category, so NMR-STAR 2.1 tags go with the categories."""
+    if wanted is None :
+        return (None, None)
+    if isinstance( wanted, basestring ) :
+        wanted = (wanted,)
+    tags = frozenset( w for w in wanted if w.startswith( "_" ) )
+    return (tags, frozenset( wanted ) - tags)
+
+def _sf_category_tag( tag ) :
+    return tag.endswith( ".Sf_category" ) or (tag == "_Saveframe_category")
+
+class _ProjectedParser( object ) :
+    """mixin for parsers with ``wanted`` tags"""
+
+    def _wanted_tag( self, tag ) :
+        return self._sf_wanted or (tag in self._wanted) or (tag.split( ".", 1 )[0] in self._wanted)
+
+    def _category_tag( self, st ) :
+        """current tag is the saveframe category and we're waiting for its value"""
+        return st.need_value and (st.context == "save") and (len( self._sf_categories ) > 0) \
+            and _sf_category_tag( st.last_tag[0] )
+
+    def _save_start( self, token, st ) :
+        self._sf_wanted = False
+        return super( _ProjectedParser, self )._save_start( token, st )
+
+    def _save_end( self, token, st ) :
+        self._sf_wanted = False
+        return super( _ProjectedParser, self )._save_end( token, st )
+
+# data items
+#
+    def _item_tag( self, token, st ) :
+        if super( _ProjectedParser, self )._item_tag( token, st ) :
+            return True
+        if self._wanted_tag( token.value ) or self._category_tag( st ) :
+            return None
+        st.need_value = False
+        self._lexer.skip( _ITEM_ENDS )
+
+    def _item_value( self, token, st ) :
+        if self._category_tag( st ) :
+            return self._category_value( token.value, token, st )
+        return super( _ProjectedParser, self )._item_value( token, st )
+
+    def _item_delimited( self, token, st ) :
+        if self._category_tag( st ) :
+            (val, stop) = self._read_value( token.type )
+            if stop : return True
+            return self._category_value( val, token, st )
+        return super( _ProjectedParser, self )._item_delimited( token, st )
+
+    def _category_value( self, val, token, st ) :
+        """saveframe category: is the saveframe wanted? returns stop sign or None"""
+        self._sf_wanted = val in self._sf_categories
+        tag = st.last_tag
+        st.need_value = False
+        if self._wanted_tag( tag[0] ) :
+            if self._ch.data( tag = tag[0], tagline = tag[1], val = val,
+                    valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+                return True
+        elif len( self._wanted ) < 1 :
+            self._lexer.skip( _SAVE_ENDS )
+        return None
+
+# loops: the first value decides. the lexer stops at stop_, or where the loop ends implicitly.
+#
+    def _wanted_loop( self, st ) :
+        for (tag, line) in st.tags :
+            if self._wanted_tag( tag ) :
+                return True
+        return False
+
+    def _skip_loop( self, token, st ) :
+        if self._first_value( token, st ) :
+            return True
+        st.skip = True
+        self._lexer.skip( _LOOP_ENDS )
+
+    def _loop_value( self, token, st ) :
+        if st.header and not self._wanted_loop( st ) :
+            return self._skip_loop( token, st )
+        return super( _ProjectedParser, self )._loop_value( token, st )
+
+    def _loop_delimited( self, token, st ) :
+        if st.header and not self._wanted_loop( st ) :
+            return self._skip_loop( token, st )
+        return super( _ProjectedParser, self )._loop_delimited( token, st )
+
+# skipped values weren't counted
+#
+    def _loop_errors( self, line, st ) :
+        if st.skip :
+            return False
+        return super( _ProjectedParser, self )._loop_errors( line, st )
+
+    def _loop_eof( self, token, st ) :
+        if st.skip :
+            self._eh.fatalError( line = _line( token, st.line ), msg = "EOF in loop (no closing stop_)" )
+            return True
+        return super( _ProjectedParser, self )._loop_eof( token, st )
+
+#
+#
+def _projected_class( cls ) :
+    """``wanted`` variant of parser class ``cls``"""
+    if issubclass( cls, _ProjectedParser ) :
+        return cls
+    if cls not in _PROJECTED :
+        attrs = { "__module__" : cls.__module__, "__doc__" : cls.__doc__ }
+        _PROJECTED[cls] = type( cls )( cls.__name__, (_ProjectedParser, cls), attrs )
+    return _PROJECTED[cls]
+
+###################################################################################################
+# debug parsers
+#
+# the verbose parser is a subclass of the same name that says what it's doing: prints parse method
+# calls and tokens read in ``_trace_tokens`` methods (through a ``_TokenTrace`` wrapped around
+# the lexer for the duration of the call).
+#
+_TRACED = ("_parse_file", "_parse_data", "_parse_save", "_parse_loop", "_read_value")
+_VERBOSE = {}
+
+class _VerboseParser( object ) :
+    """mixin for ``verbose = True`` parsers"""
+    pass
+
+class _TokenTrace( sas.StarLexer ) :
+    """lexer wrapper: prints the tokens as the parser reads them"""
+
+    def __new__( cls, *args ) :
+        return object.__new__( cls )
+
+    def __init__( self, lexer, parser, method ) :
+        self._real = lexer
+        self._parser = parser
+        self._method = method
+
+    def __iter__( self ) :
+        iter( self._real )
+        return self
+
+    def next( self ) :
+        token = self._real.next()
+        self._parser._trace_token( self._method, token )
+        return token
+
+    def push_back( self, token ) :
+        self._real.push_back( token )
+
+    def skip( self, types ) :
+        self._real.skip( types )
+
+    def peek( self ) :
+        return self._real.peek()
+
+#
+#
+def _traced( cls, name ) :
+    method = getattr( cls, name )
+    def traced( self, *args, **kwargs ) :
+        sys.stdout.write( "%s.%s(%s)\n" % (self.__class__.__name__, name,
+            ", ".join( str( a ) for a in args + tuple( kwargs.values() ) )) )
+        lexer = self._lexer
+        real = lexer._real if isinstance( lexer, _TokenTrace ) else lexer
+        if name in self._trace_tokens :
+            self._lexer = _TokenTrace( real, self, name )
+        else :
+            self._lexer = real
+        try :
+            return method( self, *args, **kwargs )
+        finally :
+            self._lexer = lexer
+    traced.__name__ = name
+    traced.__doc__ = method.__doc__
+    return traced
+
+#
+#
+def _verbose_class( cls ) :
+    """debug variant of parser class ``cls``"""
+    if issubclass( cls, _VerboseParser ) :
+        return cls
+    if cls not in _VERBOSE :
+        attrs = { "__module__" : cls.__module__, "__doc__" : cls.__doc__ }
+        for name in _TRACED :
+            if hasattr( cls, name ) :
+                attrs[name] = _traced( cls, name )
+        _VERBOSE[cls] = type( cls )( cls.__name__, (_VerboseParser, cls), attrs )
+    return _VERBOSE[cls]
 
 ###################################################################################################
 # just to make sure it fails
@@ -105,5 +961,5 @@ if __name__ == "__main__" :
 
     e = sas.ErrorHandler()
     c = Ch()
-    l = sas.StarLexer( fp = sys.stdin, bufsize = 0, verbose = False )
+    l = sas.StarLexer( fp = sys.stdin, verbose = False )
     p = ParserBase.parse( lexer = l, content_handler = c, error_handler = e, verbose = False )
@@ -0,0 +1,936 @@
+#!/usr/bin/python -u
+#
+# Regex scanning engine for StarLexer
+#
+
+"""
+Single-regex scanning engine for ``StarLexer``
+
+This is a drop-in replacement for the PLY lexer object: it has the same ``input()``/``token()``
+interface, lexical states, and ``lexdata``/``lexpos``/``lineno`` attributes, and it returns the
+same token types as ``StarLexer``'s ``t_`` rules (it is a re-implementation of those rules).
+
+Instead of calling a python method for every token, each lexical state is scanned with one
+precompiled alternation. Lookahead and lookbehind that PLY rules do in python (e.g. "is this
+semicolon at the start of a line", "is this quote followed by whitespace") are part of the
+regexps, so most tokens are produced without any python-level checks.
+
+Tokens are ``Token`` objects: they have the same attributes as PLY's ``LexToken`` but no
+``__dict__``. With ``lazylines`` they are ``LazyToken`` objects instead: the scanner does not
+count newlines, a token's ``lineno`` is a ``Line`` that counts them in the input buffer when
+(if) it's used as a number.
+
+In python 3 ``bytes`` input (and memory-mapped files) is scanned as is, with ``bytes`` versions of
+the same regexps, and only token values are decoded (ASCII or UTF-8, see ``Scanner``).
+
+Use it via ``StarLexer( ..., engine = "regex" )``.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import os
+import re
+import bisect
+import mmap
+import itertools
+
+# optional: vectorized loop values
+#
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+if __name__ == "__main__" :
+    sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# python 3: anything that isn't str (bytes, mmap) is scanned as bytes. python 2 str is bytes.
+#
+_PY3 = str is not bytes
+
+def _binary( data ) :
+    return _PY3 and not isinstance( data, str )
+
+# what to do with the match
+#
+_TOKEN = 0      # return as is
+_NEWLINES = 1   # newlines: count them
+_COUNT = 2      # may contain newlines: count them
+_STRIP = 3      # strip first ``arg`` characters from value
+_LSTRIP = 4     # lstrip ``arg`` from value
+_PUSH = 5       # push ``arg`` state
+_POP = 6        # pop state
+_ERROR = 7      # newline in quoted value
+_LOOP = 8       # loop_: start looking for bulk values
+_ENDLOOP = 9    # stop_: stop looking for bulk values
+_UNQUOTE = 10   # strip opening and closing quote
+_SKIP = 11      # whitespace: count newlines and go on to the next token
+_BLANKS = 12    # whitespace: count newlines, return in the reusable whitespace token
+
+# token rules for each lexical state: (regexp, token type, action, action argument)
+#
+# These are StarLexer's ``t_`` rules in the order PLY tries them (i.e. in the order they are
+# defined in ``lexer.py``). Rules that can never match because an earlier one always does
+# are left out. Inner groups must be non-capturing: ``lastindex`` is the rule number.
+#
+# The exception is the first INITIAL rule: a bareword that starts with a character no other
+# rule can start with. It is the most common token, and python regexps try alternatives in
+# order, so it goes first.
+#
+_RULES = {
+    "INITIAL" : (
+        (r"[^\s\x07'\";#gGdDsl_$]\S*", "CHARACTERS", _TOKEN, None),
+        (r"\n+", "NL", _BLANKS, None),
+        (r"\s+", "SPACE", _BLANKS, None),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r"'(?!'')(?:[^'\n\x07]|'(?=\S))*'(?=\s|\Z)", "SINGLEVALUE", _UNQUOTE, None),
+        (r"'''", "TSINGLESTART", _PUSH, "YYTSINGLE"),
+        (r"'", "SINGLESTART", _PUSH, "YYSINGLE"),
+        (r'\x07"', "CHARACTERS", _STRIP, 1),
+        (r'"(?!"")(?:[^"\n\x07]|"(?=\S))*"(?=\s|\Z)', "DOUBLEVALUE", _UNQUOTE, None),
+        (r'"""', "TDOUBLESTART", _PUSH, "YYTDOUBLE"),
+        (r'"', "DOUBLESTART", _PUSH, "YYDOUBLE"),
+        (r"(?<![^\n]);", "SEMISTART", _PUSH, "YYSEMI"),
+        (r";", "CHARACTERS", _TOKEN, None),
+        (r"\#.*", "COMMENT", _STRIP, 1),
+        (r"[Gg][Ll][Oo][Bb][Aa][Ll]_(?:\s+|$)", "GLOBALSTART", _COUNT, None),
+        (r"[Dd][Aa][Tt][Aa]_\S+", "DATASTART", _STRIP, 5),
+        (r"save_\S+", "SAVESTART", _STRIP, 5),
+        (r"save_(?:\s+|$)", "SAVEEND", _COUNT, None),
+        (r"loop_", "LOOPSTART", _LOOP, None),
+        (r"stop_", "STOP", _ENDLOOP, None),
+        (r"_\S+", "TAGNAME", _TOKEN, None),
+        (r"\$\S+", "FRAMECODE", _LSTRIP, "$"),
+        (r"\S+", "CHARACTERS", _TOKEN, None),
+    ),
+    "YYSINGLE" : (
+        (r"\n+", None, _ERROR, "Newline in quoted value"),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r"'(?=\s|\Z)", "SINGLEEND", _POP, None),
+        (r"'", "CHARACTERS", _TOKEN, None),
+        (r"[^'\x07\n]+", "CHARACTERS", _TOKEN, None),
+        (r'\x07"', "CHARACTERS", _STRIP, 1),
+    ),
+    "YYDOUBLE" : (
+        (r"\n+", None, _ERROR, "Newline in quoted value"),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r"'", "CHARACTERS", _TOKEN, None),
+        (r'\x07"', "CHARACTERS", _STRIP, 1),
+        (r'"(?=\s|\Z)', "DOUBLEEND", _POP, None),
+        (r'"', "CHARACTERS", _TOKEN, None),
+        (r'[^"\x07\n]+', "CHARACTERS", _TOKEN, None),
+    ),
+    "YYTSINGLE" : (
+        (r"\n+", "NL", _NEWLINES, None),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r"'''", "TSINGLEEND", _POP, None),
+        (r"(?:[^']+)|'{1,2}", "CHARACTERS", _COUNT, None),
+    ),
+    "YYTDOUBLE" : (
+        (r"\n+", "NL", _NEWLINES, None),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r'\x07"', "CHARACTERS", _STRIP, 1),
+        (r'"""', "TDOUBLEEND", _POP, None),
+        (r'(?:[^"]+)|"{1,2}', "CHARACTERS", _COUNT, None),
+    ),
+    "YYSEMI" : (
+        (r"\n+", "NL", _NEWLINES, None),
+        (r"\x07'", "CHARACTERS", _STRIP, 1),
+        (r"'", "CHARACTERS", _TOKEN, None),
+        (r'\x07"', "CHARACTERS", _STRIP, 1),
+        (r'"', "CHARACTERS", _TOKEN, None),
+        (r"(?<![^\n]);", "SEMIEND", _POP, None),
+        (r";", "CHARACTERS", _TOKEN, None),
+        (r".+", "CHARACTERS", _TOKEN, None),
+    )
+}
+
+# characters ignored between tokens (INITIAL state only, same as StarLexer.t_ignore)
+#
+_IGNORE = " \t"
+
+# whitespace is ASCII, the same for str and bytes input (and PLY engine): python 3 str regexps
+# are compiled with re.ASCII. ``str.split()`` splits on more: these are not bulk values (below)
+#
+_ASCII = getattr( re, "ASCII", 0 )
+_SPACES = " \t\n\r\f\v"
+_OTHER_SPACES = u"".join( u"%c" % (c,) for c in range( 0x3001 )
+    if (u"%c" % (c,)).isspace() and (u"%c" % (c,)) not in _SPACES )
+
+#
+#
+def _compile( rules, ignore ) :
+    """build master regexp for a state: returns (regexp, rule table indexed by group number).
+    ``ignore`` is a regexp character class of what's skipped before a token"""
+    pat = "|".join( "(%s)" % (r[0],) for r in rules )
+    if ignore != "" :
+        pat = "%s*(?:%s)" % (ignore, pat)
+    table = [None]
+    table.extend( r[1:] for r in rules )
+    return (re.compile( pat, _ASCII ), tuple( table ))
+
+_IGNORE_RE = "[%s]" % (re.escape( _IGNORE ),)
+_STATES = dict( (state, _compile( rules, (state == "INITIAL" and _IGNORE_RE or "") ))
+    for (state, rules) in _RULES.items() )
+_BLANK = re.compile( "[%s]*" % (re.escape( _IGNORE ),) )
+
+# same without whitespace tokens in INITIAL state
+#
+_QUIET_STATES = dict( _STATES )
+_QUIET_STATES["INITIAL"] = _compile( tuple( ((r[0], None, _SKIP, None) if r[1] in ("NL", "SPACE") else r)
+    for r in _RULES["INITIAL"] ), _IGNORE_RE )
+
+# lazy line numbers: no newline counting. without whitespace tokens, all whitespace is ignored
+# (the regexp skips it) in INITIAL state: what SPACE rule matches, so no input is illegal only
+# in this mode.
+#
+_NOCOUNT = { _NEWLINES : _TOKEN, _COUNT : _TOKEN, _BLANKS : _TOKEN }
+
+_LAZY_RULES = dict( (state, tuple( (r[0], r[1], _NOCOUNT.get( r[2], r[2] ), r[3]) for r in rules ))
+    for (state, rules) in _RULES.items() )
+_LAZY_STATES = dict( (state, _compile( rules, (state == "INITIAL" and _IGNORE_RE or "") ))
+    for (state, rules) in _LAZY_RULES.items() )
+_LAZY_QUIET_STATES = dict( _LAZY_STATES )
+_LAZY_QUIET_STATES["INITIAL"] = _compile( tuple( r for r in _LAZY_RULES["INITIAL"]
+    if r[1] not in ("NL", "SPACE") ), r"\s" )
+_LAZY_BLANK = re.compile( r"\s*", _ASCII )
+_NEWLINE = re.compile( "\n" )
+
+# lexical state tables for (lazylines, whitespace)
+#
+_MODES = {
+    (False, True) : (_STATES, _BLANK),
+    (False, False) : (_QUIET_STATES, _BLANK),
+    (True, True) : (_LAZY_STATES, _BLANK),
+    (True, False) : (_LAZY_QUIET_STATES, _LAZY_BLANK)
+}
+
+# bulk loop values: the rest of the line is a run of bare values if there is nothing in it
+# any rule other than the bareword CHARACTERS could match: no quotes, semicolons, comments,
+# framecodes, bell-escapes, and no word that starts with a tag or a keyword.
+#
+_NOTBULK_RE = r"""['";#$\x07]|(?<!\S)(?:_|loop_|stop_|save_|data_|global_)"""
+_NOTBULK = re.compile( _NOTBULK_RE + (_PY3 and (u"|[%s]" % (_OTHER_SPACES,)) or ""), re.IGNORECASE | _ASCII )
+
+# shortest line worth the check and split: on shorter ones (a handful of values) the regexps
+# are as fast
+#
+_BULK = 48
+
+# skipping: what can start a token that is not a bareword (INITIAL state), by group number.
+# keywords and tags are token types, the rest is what to do: find the end of the value, or
+# go back to making tokens (bell-escapes, and semicolons in the middle of a line or loop_ and
+# stop_ with no space after them: what comes after them is a new token).
+#
+_SKIP_SEMI = 1
+_SKIP_TSINGLE = 2
+_SKIP_TDOUBLE = 3
+_SKIP_SINGLE = 4
+_SKIP_DOUBLE = 5
+_SKIP_COMMENT = 6
+_SKIP_TOKENS = 7
+
+_SKIP_RE = re.compile( r"((?<![^\n]);)|(?<!\S)(?:(''')|(\"\"\")|(')|(\")|(\#)|([;\x07]|(?:loop_|stop_)(?!\s|\Z))"
+    r"|([Gg][Ll][Oo][Bb][Aa][Ll]_(?=\s|\Z))|([Dd][Aa][Tt][Aa]_\S+)|(save_\S+)|(save_(?=\s|\Z))"
+    r"|(loop_)|(stop_)|(_\S+))", _ASCII )
+
+# what can start one of those: searching for a character is much faster than for the patterns
+#
+_SKIP_START = re.compile( r"[;'\"#\x07_dDgGsl](?<!\S.)", _ASCII )
+_SKIP_TYPES = (None, None, None, None, None, None, None, None,
+    "GLOBALSTART", "DATASTART", "SAVESTART", "SAVEEND", "LOOPSTART", "STOP", "TAGNAME")
+
+# one-line quoted values are INITIAL rules, multi-line values end with these
+#
+_SKIP_VALUES = {
+    _SKIP_SEMI : re.compile( r"(?<![^\n]);" ),
+    _SKIP_TSINGLE : re.compile( r"'''" ),
+    _SKIP_TDOUBLE : re.compile( r'"""' ),
+    _SKIP_SINGLE : re.compile( _RULES["INITIAL"][4][0], _ASCII ),
+    _SKIP_DOUBLE : re.compile( _RULES["INITIAL"][8][0], _ASCII ),
+    _SKIP_COMMENT : re.compile( r"\n" )
+}
+_BELL = re.compile( "\x07" )
+
+# skipping from inside a multi-line value
+#
+_SKIP_STATES = { "YYSEMI" : _SKIP_SEMI, "YYTSINGLE" : _SKIP_TSINGLE, "YYTDOUBLE" : _SKIP_TDOUBLE }
+
+# the same for bytes (python 3). all the regexps are ASCII, and so is their ``\s``.
+#
+def _encode( rx ) :
+    return re.compile( rx.pattern.encode( "ascii" ), rx.flags & ~re.UNICODE )
+
+if _PY3 :
+    _BYTES_MODES = dict( (mode, (dict( (state, (_encode( rx ), table))
+        for (state, (rx, table)) in states.items() ), _encode( blank )))
+        for (mode, (states, blank)) in _MODES.items() )
+    _BYTES_NEWLINE = _encode( _NEWLINE )
+    _BYTES_NOTBULK = re.compile( _NOTBULK_RE.encode( "ascii" ), re.IGNORECASE )
+    _BYTES_SKIP_RE = _encode( _SKIP_RE )
+    _BYTES_SKIP_START = _encode( _SKIP_START )
+    _BYTES_SKIP_VALUES = dict( (k, _encode( rx )) for (k, rx) in _SKIP_VALUES.items() )
+    _BYTES_BELL = _encode( _BELL )
+
+# vectorized bulk values: characters per block, and fewest lines in it for numpy to beat
+# splitting them one at a time (one long line or a few short ones are faster without)
+#
+_VECTOR = 1 << 16
+_VECTOR_LINES = 32
+
+################################################################
+#
+class Token( object ) :
+    """
+    Lexical token: ``type``, ``value``, ``lineno``, ``lexpos``, and ``lexer``, same as
+    ``ply.lex.LexToken``, in slots.
+    """
+
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer")
+
+    def __init__( self, type, value, lineno, lexpos, lexer ) :
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.lexer = lexer
+
+    def __str__( self ) :
+        return "Token(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+
+    def __repr__( self ) :
+        return str( self )
+
+################################################################
+# lazy line numbers
+#
+# mmap has no count() (in python 2): count a slice at a time
+#
+def _newlines( data, start = 0, end = None ) :
+    if end is None : end = len( data )
+    nl = _binary( data ) and b"\n" or "\n"
+    if not isinstance( data, mmap.mmap ) :
+        return data.count( nl, start, end )
+    n = 0
+    for i in range( start, end, 1 << 20 ) :
+        n += data[i:min( i + (1 << 20), end )].count( nl )
+    return n
+
+#
+#
+class Lines( object ) :
+    """
+    Line numbers in an input buffer: ``line( pos )`` is the number of the line ``pos`` is on.
+
+    It counts newlines from the last position it was asked about, so asking in increasing
+    order (the usual case) counts each newline once. The first time it's asked about an
+    earlier position, it makes an index of all newlines in the buffer and uses that from then on.
+    """
+
+    __slots__ = ("data", "first", "_pos", "_line", "_index")
+
+    def __init__( self, data, first ) :
+        self.data = data
+        self.first = first
+        self._pos = 0
+        self._line = first
+        self._index = None
+
+    def line( self, pos ) :
+        if self._index is not None :
+            return self.first + bisect.bisect_left( self._index, pos )
+        if pos < self._pos :
+            newline = _binary( self.data ) and _BYTES_NEWLINE or _NEWLINE
+            self._index = [m.start() for m in newline.finditer( self.data )]
+            return self.line( pos )
+        self._line += _newlines( self.data, self._pos, pos )
+        self._pos = pos
+        return self._line
+
+    def end( self ) :
+        """line number at the end of the buffer, i.e. the first line of the next one"""
+        return self.first + _newlines( self.data )
+
+#
+#
+class Line( object ) :
+    """
+    Line number that is not counted until it's used: as an ``int``, in a comparison, in
+    arithmetic, or printed. It holds on to its input buffer until then (and after).
+    """
+
+    __slots__ = ("_lines", "_pos")
+
+    def __init__( self, lines, pos ) :
+        self._lines = lines
+        self._pos = pos
+
+    def __int__( self ) :
+        return self._lines.line( self._pos )
+    __index__ = __int__
+    __long__ = __int__
+
+    def __str__( self ) :
+        return str( int( self ) )
+    __repr__ = __str__
+
+    def __format__( self, spec ) :
+        return format( int( self ), spec )
+
+    def __hash__( self ) :
+        return hash( int( self ) )
+
+    def __eq__( self, other ) :
+        return int( self ) == other
+    def __ne__( self, other ) :
+        return int( self ) != other
+    def __lt__( self, other ) :
+        return int( self ) < other
+    def __le__( self, other ) :
+        return int( self ) <= other
+    def __gt__( self, other ) :
+        return int( self ) > other
+    def __ge__( self, other ) :
+        return int( self ) >= other
+
+    def __add__( self, other ) :
+        return int( self ) + other
+    __radd__ = __add__
+    def __sub__( self, other ) :
+        return int( self ) - other
+    def __rsub__( self, other ) :
+        return other - int( self )
+
+#
+#
+class LazyToken( object ) :
+    """``Token`` with ``lineno`` as a ``Line``: carries its input buffer and offset in it"""
+
+    __slots__ = ("type", "value", "_lines", "lexpos", "lexer")
+
+    def __init__( self, type, value, lines, lexpos, lexer ) :
+        self.type = type
+        self.value = value
+        self._lines = lines
+        self.lexpos = lexpos
+        self.lexer = lexer
+
+    @property
+    def lineno( self ) :
+        return Line( self._lines, self.lexpos )
+
+    def __str__( self ) :
+        return "Token(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+
+    def __repr__( self ) :
+        return str( self )
+
+################################################################
+#
+class Scanner( object ) :
+    """
+    Regex scanner for STAR lexical states.
+
+    Mimics the subset of ``ply.lex.Lexer`` that ``StarLexer`` and the parsers use.
+    Tokens are ``Token`` objects with ``type``, ``value``, ``lineno``, ``lexpos``, and ``lexer``
+    attributes, same as PLY's.
+
+    NL and SPACE tokens between values are there to be skipped: they are all the same
+    ``Token`` object, updated for every one. Don't keep references to them.
+
+    With ``bulk`` on, once inside a loop the rest of each line is checked for anything other
+    than bare values. If there's none, the line is split in one ``split()`` and its values
+    are returned as CHARACTERS tokens without going through the regexps. Whitespace between
+    them is not returned as SPACE tokens, and all of them have the ``lexpos`` of the first one.
+    Lines shorter than ``_BULK`` characters are left to the regexps: it only pays off on wide
+    rows.
+
+    ``vectorize`` (needs numpy) is ``bulk`` for all the lines of bare values that follow, a
+    block of ``_VECTOR`` characters at a time: one ``split()`` for the values, and numpy
+    arrays for their offsets and line numbers. Each value has its own ``lexpos``. It only
+    pays off on long runs of short rows: runs of fewer than ``_VECTOR_LINES`` lines (and one
+    long line) go through ``bulk`` as above.
+
+    With ``semiblock`` on, the text of a semicolon-delimited value is returned as one
+    CHARACTERS token (up to and including the newline before the closing semicolon) instead
+    of CHARACTERS and NL tokens for every line. A value that runs past the end of the input
+    buffer is continued in the next one.
+
+    With ``whitespace`` off, NL and SPACE tokens are not returned in INITIAL state: the
+    newlines are counted and the scanner goes on to the next token. NL tokens inside
+    multi-line values are still returned, they are part of the value.
+
+    In python 3, ``bytes`` input (anything that isn't ``str``) is scanned with ``bytes`` regexps and
+    token values are decoded with ``encoding``: lexer positions are byte offsets.
+
+    With ``lazylines`` on, newlines are not counted. ``lineno`` is a ``Lines`` object for the
+    current input buffer and tokens are ``LazyToken`` objects. Without ``whitespace`` too, the
+    whitespace between tokens is skipped by the regexps.
+    """
+
+    #
+    #
+    def __init__( self, bulk = False, semiblock = False, whitespace = True, lazylines = False,
+            vectorize = False, encoding = "utf-8" ) :
+        if vectorize and (numpy is None) :
+            raise ImportError( "vectorize needs numpy" )
+        self._vectorize = bool( vectorize )
+        self._bulk = bool( bulk or vectorize )
+        self._semiblock = bool( semiblock )
+        self._lazy = bool( lazylines )
+        self._mode = (self._lazy, bool( whitespace ))
+        self._encoding = encoding
+        self._token = self._lazy and LazyToken or Token
+        self._blanks = Token( "SPACE", "", 0, 0, self )
+        self._binary = None
+        self._state = "INITIAL"
+        self._set_binary( False )
+        self.reset()
+
+    # text or bytes regexps
+    #
+    def _set_binary( self, binary ) :
+        """scan ``str`` (``binary`` is False) or ``bytes`` input from now on"""
+        if binary == self._binary :
+            return
+        self._binary = binary
+        if binary :
+            (self._states, self._blank) = _BYTES_MODES[self._mode]
+            self._notbulk_re = _BYTES_NOTBULK
+            self._skip = (_BYTES_SKIP_START, _BYTES_SKIP_RE, _BYTES_SKIP_VALUES, _BYTES_BELL)
+            self._nl = b"\n"
+            self._semi = b";"
+            self._spaces = _SPACES.encode( "ascii" )
+        else :
+            (self._states, self._blank) = _MODES[self._mode]
+            self._notbulk_re = _NOTBULK
+            self._skip = (_SKIP_START, _SKIP_RE, _SKIP_VALUES, _BELL)
+            self._nl = "\n"
+            self._semi = ";"
+            self._spaces = _SPACES
+        self.begin( self._state )
+
+    #
+    #
+    def reset( self ) :
+        """start over: no input, line 1, INITIAL state"""
+        self.lexdata = None
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = self._lazy and Lines( "", 1 ) or 1
+        self._stack = []
+        self._inloop = False
+        self._checked = 0
+        self._notbulk = -1
+        self._values = []
+        self.skipped = None
+        self.begin( "INITIAL" )
+
+    #
+    #
+    def input( self, data ) :
+        """set new input buffer. Lexical state and line number are kept.
+
+        In python 3 ``data`` that isn't ``str`` (``bytes``, ``mmap``) is scanned as bytes and
+        token values are decoded with ``encoding``."""
+        self._set_binary( _binary( data ) )
+        if self._lazy :
+            self.lineno = Lines( data, self.lineno.end() )
+        self.lexdata = data
+        self.lexpos = 0
+        self.lexlen = len( data )
+        self._checked = 0
+        self._notbulk = -1
+        self._values = []
+
+    # lexical state
+    #
+    def begin( self, state ) :
+        (self._re, self._rules) = self._states[state]
+        self._state = state
+
+    def push_state( self, state ) :
+        self._stack.append( self._state )
+        self.begin( state )
+
+    def pop_state( self ) :
+        self.begin( self._stack.pop() )
+
+    def current_state( self ) :
+        return self._state
+
+    #
+    #
+    def token( self ) :
+        """returns next token or None at the end of input buffer"""
+        if self._values :
+            return self._values.pop()
+
+# a loop, not recursion, for skipped whitespace
+#
+        while True :
+            data = self.lexdata
+            pos = self.lexpos
+            if pos >= self.lexlen :
+                return None
+
+            if self._inloop and (pos >= self._checked) and (self._state == "INITIAL") :
+                if self._bulk_values( data, pos ) :
+                    return self._values.pop()
+
+            if self._semiblock and (self._state == "YYSEMI") :
+                if (data[pos:pos + 1] != self._semi) \
+                        or ((pos > 0) and (data[pos - 1:pos] != self._nl)) :
+                    return self._semi_block( data, pos )
+
+            m = self._re.match( data, pos )
+            if m is None :
+                pos = self._blank.match( data, pos ).end()
+                if pos >= self.lexlen :
+                    self.lexpos = pos
+                    return None
+                line = self._lazy and self.lineno.line( pos ) or self.lineno
+                raise sas.SasException( line = line, msg = "Illegal character %r in line %d" \
+                    % (data[pos:pos + 1], line,) )
+
+            i = m.lastindex
+            (ttype, action, arg) = self._rules[i]
+            (pos, self.lexpos) = m.span( i )
+            val = m.group( i )
+            if self._binary :
+                val = val.decode( self._encoding )
+            if action == _TOKEN :
+                return self._token( ttype, val, self.lineno, pos, self )
+
+            lineno = self.lineno
+            if action == _BLANKS :
+                tok = self._blanks
+                tok.type = ttype
+                tok.value = val
+                tok.lineno = lineno
+                tok.lexpos = pos
+                self.lineno += val.count( "\n" )
+                return tok
+            elif action == _NEWLINES :
+                self.lineno += len( val )
+            elif action == _COUNT :
+                self.lineno += val.count( "\n" )
+            elif action == _STRIP :
+                val = val[arg:]
+            elif action == _LSTRIP :
+                val = val.lstrip( arg )
+            elif action == _PUSH :
+                self.push_state( arg )
+            elif action == _POP :
+                self.pop_state()
+            elif action == _UNQUOTE :
+                val = val[1:-1]
+            elif action == _LOOP :
+                self._inloop = self._bulk
+            elif action == _ENDLOOP :
+                self._inloop = False
+            elif action == _SKIP :
+                self.lineno += val.count( "\n" )
+                continue
+            elif action == _ERROR :
+                if self._lazy :
+                    raise sas.SasException( msg = arg, line = self.lineno.line( self.lexpos ) )
+                self.lineno += len( val )
+                raise sas.SasException( msg = arg, line = self.lineno )
+
+            return self._token( ttype, val, lineno, pos, self )
+
+    #
+    #
+    def tokens( self, batch, size ) :
+        """appends up to ``size`` tokens to list ``batch``, fewer at the end of input buffer.
+
+        NL and SPACE tokens between values are copied: they're all one object in ``token()``."""
+        token = self.token
+        append = batch.append
+        blanks = self._blanks
+        left = size
+        while left > 0 :
+
+# bulk values are tokens already
+#
+            values = self._values
+            if values :
+                n = min( left, len( values ) )
+                batch.extend( reversed( values[-n:] ) )
+                del values[-n:]
+                left -= n
+                continue
+            t = token()
+            if t is None : break
+            if t is blanks :
+                t = Token( t.type, t.value, t.lineno, t.lexpos, self )
+            append( t )
+            left -= 1
+
+    #
+    #
+    def skip( self, types ) :
+        """move past the input up to the next token of one of ``types``: keywords (GLOBALSTART,
+        DATASTART, SAVESTART, SAVEEND, LOOPSTART, STOP) and TAGNAME. Values, comments, other
+        keywords and tags in between are stepped over without making tokens.
+
+        Returns True if the next token is one of ``types``, False at the end of input buffer, and
+        None if the scanner can't tell without making tokens: inside a one-line quoted value, at
+        a bell-escape, or at a value with no end in this buffer. (Then make some and try again.)
+
+        ``skipped`` is an NL token on the line of the last thing skipped, None if there was none:
+        at the end of input that's where the last token would have been."""
+
+        self.skipped = None
+        (first, skip, values, bell) = self._skip
+        data = self.lexdata
+        start = self.lexpos
+        pos = start
+
+# batch of tokens may end inside a multi-line value: its end
+#
+        if self._state != "INITIAL" :
+            i = _SKIP_STATES.get( self._state )
+            if i is None :
+                return None
+            v = values[i].search( data, pos )
+            if v is None :
+                return None
+            if (i != _SKIP_SEMI) and (bell.search( data, pos, v.start() ) is not None) :
+                return None
+            pos = v.end()
+            self.pop_state()
+
+# queued bulk values are bare values
+#
+        self._values = []
+        rc = False
+        while True :
+            m = first.search( data, pos )
+            if m is None :
+                pos = self.lexlen
+                break
+            pos = m.start()
+            m = skip.match( data, pos )
+            if m is None :
+                pos += 1
+                continue
+            i = m.lastindex
+            if i == _SKIP_TOKENS :
+                rc = None
+                break
+
+            ttype = _SKIP_TYPES[i]
+            if ttype is not None :
+                if ttype in types :
+                    rc = True
+                    break
+                if ttype == "LOOPSTART" :
+                    self._inloop = self._bulk
+                elif ttype == "STOP" :
+                    self._inloop = False
+                pos = m.end()
+                continue
+
+# values: one-line quoted values match from the quote, the rest end after it
+#
+            if i in (_SKIP_SINGLE, _SKIP_DOUBLE) :
+                v = values[i].match( data, pos )
+            else :
+                v = values[i].search( data, m.end() )
+            if v is None :
+                if i == _SKIP_COMMENT :
+                    pos = self.lexlen
+                    break
+                rc = None
+                break
+            if (i in (_SKIP_TSINGLE, _SKIP_TDOUBLE)) and (bell.search( data, m.end(), v.start() ) is not None) :
+                rc = None
+                break
+            pos = v.end()
+
+        if not self._lazy :
+            self.lineno += _newlines( data, start, pos )
+        self.lexpos = pos
+
+        end = pos
+        while (end > start) and (data[end - 1:end] in self._spaces) :
+            end -= 1
+        if end > start :
+            line = self.lineno
+            if not self._lazy :
+                line -= _newlines( data, end, pos )
+            self.skipped = self._token( "NL", self._nl, line, end - 1, self )
+        return rc
+
+    # bulk loop values
+    #
+    def _bulk_values( self, data, pos ) :
+        """if the rest of the line from ``pos`` is bare values, queue them up and return True"""
+        if self._vectorize :
+            return self._bulk_lines( data, pos )
+        return self._bulk_line( data, pos )
+
+    def _bulk_line( self, data, pos ) :
+        eol = data.find( self._nl, pos )
+        if eol < 0 :
+            eol = self.lexlen
+        self._checked = eol
+        if eol - pos < _BULK :
+            return False
+        line = data[pos:eol]
+
+# vectorize has already searched past it
+#
+        if (eol > self._notbulk) and self._notbulk_re.search( line ) :
+            return False
+        values = line.split()
+        if len( values ) < 1 :
+            return False
+
+# leave trailing whitespace (e.g. \r) to the regexps
+#
+        self.lexpos = pos + len( line.rstrip() )
+        if self._binary :
+            values = self._decode( values )
+        values.reverse()
+        n = len( values )
+        self._values = list( map( self._token, itertools.repeat( "CHARACTERS", n ), values,
+            itertools.repeat( self.lineno, n ), itertools.repeat( pos, n ),
+            itertools.repeat( self, n ) ) )
+        return True
+
+    # vectorized bulk loop values
+    #
+    def _bulk_lines( self, data, pos ) :
+        """same as ``_bulk_values()`` for the lines of bare values from ``pos`` on, up to
+        ``_VECTOR`` characters of them at a time (or one longer line). Fewer than
+        ``_VECTOR_LINES`` lines are left to ``_bulk_line()``, one at a time.
+
+        Values are ``split()`` of the lot, numpy finds where each one starts (after whitespace)
+        and what line it's on (number of newlines before it)."""
+
+# where the next non-bare value is: search once for the whole run of lines
+#
+        nl = self._nl
+        if self._notbulk < pos :
+            m = self._notbulk_re.search( data, pos )
+            self._notbulk = m is None and self.lexlen or m.start()
+        if self._notbulk >= self.lexlen :
+            end = self.lexlen
+        else :
+            end = data.rfind( nl, pos, self._notbulk )
+
+# first line isn't bare values
+#
+        if end < 0 :
+            eol = data.find( nl, pos )
+            self._checked = eol < 0 and self.lexlen or eol
+            return False
+
+        if end - pos > _VECTOR :
+            eol = data.rfind( nl, pos, pos + _VECTOR )
+            if eol < 0 :
+                eol = data.find( nl, pos + _VECTOR, end )
+            if eol >= 0 :
+                end = eol
+        eol = pos
+        for i in range( _VECTOR_LINES ) :
+            eol = data.find( nl, eol, end ) + 1
+            if eol < 1 :
+                return self._bulk_line( data, pos )
+
+        self._checked = end
+        text = data[pos:end]
+        values = text.split()
+        if len( values ) < 1 :
+            return False
+        if self._binary :
+            values = self._decode( values )
+
+        (chars, space) = _whitespace( text )
+        starts = numpy.flatnonzero( ~space & numpy.concatenate( ([True], space[:-1]) ) )
+        last = len( text.rstrip() )
+        if self._lazy :
+            lines = itertools.repeat( self.lineno, len( values ) )
+        else :
+            newlines = numpy.cumsum( chars == 10 )
+            lines = (newlines[starts] + self.lineno).tolist()
+            self.lineno += int( newlines[last - 1] )
+
+# leave trailing whitespace to the regexps
+#
+        self.lexpos = pos + last
+        n = len( values )
+        tokens = list( map( self._token, itertools.repeat( "CHARACTERS", n ), values, lines,
+            (starts + pos).tolist(), itertools.repeat( self, n ) ) )
+        tokens.reverse()
+        self._values = tokens
+        return True
+
+    # bytes values
+    #
+    def _decode( self, values ) :
+        encoding = self._encoding
+        return [v.decode( encoding ) for v in values]
+
+    # semicolon-delimited value
+    #
+    def _semi_block( self, data, pos ) :
+        """returns everything up to the closing semicolon (or end of buffer) as one token"""
+        end = data.find( self._nl + self._semi, pos )
+        if end < 0 :
+            end = self.lexlen
+        else :
+            end += 1
+
+        val = data[pos:end]
+        if self._binary :
+            val = val.decode( self._encoding )
+        if "\x07" in val :
+            val = "\n".join( _unescape_line( s ) for s in val.split( "\n" ) )
+
+        tok = self._token( "CHARACTERS", val, self.lineno, pos, self )
+        self.lexpos = end
+        if not self._lazy :
+            self.lineno += val.count( "\n" )
+        return tok
+
+# character codes of ``text`` and which of them are (ASCII) whitespace: ``split()`` of bulk values
+#
+def _whitespace( text ) :
+    if isinstance( text, bytes ) :
+        chars = numpy.frombuffer( text, dtype = numpy.uint8 )
+    else :
+        chars = numpy.frombuffer( text.encode( "utf-32-le" ), dtype = numpy.uint32 )
+    return (chars, (chars == 32) | ((chars >= 9) & (chars <= 13)))
+
+# YYSEMI rules only see bell-escaped quotes at the start of a line or right after a quote or
+# semicolon: anywhere else ".+" has already matched them.
+#
+def _unescape_line( line ) :
+    """strip bell characters from escaped quotes the way YYSEMI rules do"""
+    i = 0
+    while i < len( line ) :
+        if line[i:i + 2] in ("\x07'", '\x07"') :
+            line = line[:i] + line[i + 1:]
+        elif line[i] not in "'\";" :
+            break
+        i += 1
+    return line
+
+#
+#
+if __name__ == "__main__" :
+
+    s = Scanner()
+    with sas.timer( "scanner" ) :
+        for line in sys.stdin :
+            s.input( line )
+            while True :
+                t = s.token()
+                if t is None : break
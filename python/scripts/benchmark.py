@@ -0,0 +1,155 @@
+#!/usr/bin/python -u
+#
+# time lexer and parsers on STAR files, under one or more python interpreters
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import json
+import glob
+import argparse
+import subprocess
+
+_UP = os.path.realpath( os.path.join( os.path.split( __file__ )[0], ".." ) )
+sys.path.append( _UP )
+import sas
+
+_TESTFILES = os.path.realpath( os.path.join( _UP, "..", "testfiles" ) )
+
+# what's timed: (label, StarLexer arguments, parse or just lex)
+#
+SETUPS = (
+    ("lexer ply", { "engine" : "ply" }, False),
+    ("lexer regex", { "engine" : "regex" }, False),
+    ("lexer regex bulk", { "engine" : "regex", "whitespace" : False, "bulk" : True,
+        "semiblock" : True }, False),
+    ("lexer regex vectorize", { "engine" : "regex", "whitespace" : False, "vectorize" : True,
+        "semiblock" : True }, False),
+    ("parser ply", { "engine" : "ply" }, True),
+    ("parser regex", { "engine" : "regex", "whitespace" : False, "bulk" : True }, True)
+)
+
+################################################################
+# handler that does nothing: we're timing the parser
+#
+class Null( sas.ContentHandler, sas.ErrorHandler ) :
+    def fatalError( self, line, msg ) :
+        pass
+    def error( self, line, msg ) :
+        return False
+    def warning( self, line, msg ) :
+        return False
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        return False
+    def endLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        return False
+
+#
+#
+def run_once( filename, lexer_args, parse ) :
+    """returns seconds it took to lex or parse ``filename``"""
+    start = time.time()
+    lexer = sas.StarLexer( filename, **lexer_args )
+    if parse :
+        h = Null()
+        if filename.endswith( ".cif" ) :
+            sas.CifParser.parse( lexer = lexer, content_handler = h, error_handler = h )
+        else :
+            sas.SansParser.parse( lexer = lexer, content_handler = h, error_handler = h )
+    else :
+        for token in lexer :
+            pass
+    return time.time() - start
+
+# best of ``repeat``: the first run includes JIT warm-up on PyPy
+#
+def run( files, repeat ) :
+    """returns list of (setup label, file name, seconds)"""
+    rc = []
+    for (label, lexer_args, parse) in SETUPS :
+        try :
+            sas.StarLexer( **lexer_args )
+        except ImportError :
+            continue
+        for filename in files :
+            secs = min( run_once( filename, lexer_args, parse ) for i in range( repeat ) )
+            rc.append( (label, os.path.basename( filename ), secs) )
+    return rc
+
+#
+#
+def interpreter_name( python ) :
+    """e.g. "CPython 3.11.7" or "PyPy 7.3.17" """
+    cmd = [python, "-c", "import platform, sys; "
+        "sys.stdout.write( '%s %s' % (platform.python_implementation(), platform.python_version()) )"]
+    return subprocess.check_output( cmd ).decode( "ascii" )
+
+# numbers from each interpreter side by side
+#
+def compare( pythons, files, repeat ) :
+    cols = []
+    times = {}
+    rows = []
+    for python in pythons :
+        name = interpreter_name( python )
+        cols.append( name )
+        cmd = [python, os.path.realpath( __file__ ), "--json", "--repeat", str( repeat )] + files
+        for (label, filename, secs) in json.loads( subprocess.check_output( cmd ).decode( "ascii" ) ) :
+            if (label, filename) not in times :
+                rows.append( (label, filename) )
+                times[(label, filename)] = {}
+            times[(label, filename)][name] = secs
+
+    width = max( len( "%s  %s" % row ) for row in rows )
+    sys.stdout.write( "%-*s" % (width, "") + "".join( "  %20s" % (c,) for c in cols ) + "\n" )
+    for row in rows :
+        sys.stdout.write( "%-*s" % (width, "%s  %s" % row ) )
+        for c in cols :
+            if c in times[row] :
+                sys.stdout.write( "  %20.3f" % (times[row][c],) )
+            else :
+                sys.stdout.write( "  %20s" % ("-",) )
+        sys.stdout.write( "\n" )
+
+#
+#
+if __name__ == "__main__" :
+
+    ap = argparse.ArgumentParser( description = "time STAR lexer and parsers" )
+    ap.add_argument( "-p", "--python", help = "interpreter to run under (repeat for several, "
+        "e.g. -p python3 -p pypy3)", dest = "pythons", action = "append", default = [] )
+    ap.add_argument( "-r", "--repeat", help = "runs per file, best one counts", dest = "repeat",
+        type = int, default = 3 )
+    ap.add_argument( "--json", help = "print results as JSON", dest = "json",
+        action = "store_true", default = False )
+    ap.add_argument( "files", nargs = "*", help = "STAR files, default: entries in testfiles directory" )
+    args = ap.parse_args( sys.argv[1:] )
+
+    files = [os.path.realpath( f ) for f in args.files]
+    if len( files ) < 1 :
+        files = sorted( glob.glob( os.path.join( _TESTFILES, "bmr*.str" ) )
+            + glob.glob( os.path.join( _TESTFILES, "*.cif" ) ) )
+
+    if args.json :
+        sys.stdout.write( json.dumps( run( files, args.repeat ) ) )
+    else :
+        compare( args.pythons or [sys.executable], files, args.repeat )
+
+#
+# eof
+#
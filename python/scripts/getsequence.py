@@ -30,6 +30,11 @@ import glob
 _UP = os.path.realpath( os.path.join( os.path.split( __file__ )[0], ".." ) )
 sys.path.append( _UP )
 import sas
+import sas.archive
+
+# universal newlines: python 3 text mode does that, and has no "U" mode (3.11)
+#
+_READ = (sys.version_info[0] < 3) and "rU" or "r"
 
 # files are in ${ENTRYDIR}/bmr${ID}/clean/bmr${ID}_[3|21].str
 #
@@ -47,6 +52,13 @@ SEQFILE = "bmr%s.%s.fasta"
 #
 HEADER = ">gnl|mdb|bmrb%s:%s %s"
 
+# with ``quick``: saveframe categories the parser passes on, entities (3.1), monomeric polymers
+# (2.1), and natural source where we stop. the rest of the entry is skipped (by regex lexer
+# without making tokens). syntax errors in skipped saveframes are not seen: an entry that is
+# broken only there gives its sequence, not None. default is to parse the whole entry.
+#
+WANTED = ("entity", "monomeric_polymer", "natural_source")
+
 ########################################################
 #
 # STAR parser: extract entity IDs, types and sequence(s)
@@ -66,17 +78,30 @@ class StarParser( sas.ContentHandler, sas.ErrorHandler ) :
     #
     #
     @classmethod
-    def parse( cls, fp, verbose = False ) :
+    def parse( cls, fp, verbose = False, quick = False ) :
         h = cls()
-        lex = sas.StarLexer( fp, bufsize = 0 )
-        p = sas.SansParser.parse( lexer = lex, content_handler = h, error_handler = h, verbose = verbose )
+        lex = sas.StarLexer( fp, engine = "regex" )
+        p = sas.SansParser.parse( lexer = lex, content_handler = h, error_handler = h, verbose = verbose,
+            wanted = (quick and WANTED or None) )
         if h._errs > 0 : return None
         return h._data
 
     @classmethod
-    def parse_file( cls, filename, verbose = False ) :
-        with open( filename, "rU" ) as f :
-            return cls.parse( fp = f, verbose = verbose )
+    def parse_file( cls, filename, verbose = False, quick = False ) :
+        return cls.parse( fp = filename, verbose = verbose, quick = quick )
+
+    # generator: (member name, data) for every entry in tar or zip archive, data is None
+    # if the entry didn't parse
+    #
+    @classmethod
+    def parse_archive( cls, archive, verbose = False, pattern = "*.str*", quick = False ) :
+        for (name, h) in sas.archive.parse_members( archive, sas.SansParser,
+                lambda name : (lambda h : (h, h))( cls() ), pattern = pattern, verbose = verbose,
+                wanted = (quick and WANTED or None), engine = "regex" ) :
+            if h._errs > 0 :
+                yield (name, None)
+            else :
+                yield (name, h._data)
 
     def __init__( self ) :
         self._data = {}
@@ -197,13 +222,13 @@ def fix_sequence( seq, kind = "prot", verbose = False ) :
 # blast complains about Xes
 #
     if kind == "nucl" : rc = rc.replace( "X", "N" )
-    rc = "\n".join( rc[i:i+80] for i in xrange( 0, len( rc ), 80 ) )
+    rc = "\n".join( rc[i:i+80] for i in range( 0, len( rc ), 80 ) )
     if verbose : sys.stdout.write( "fix_sequence()=%s\n" % (rc,) )
     return rc
 
 # return values are dict { "err" : message } or { "upd" : N, "del" : M }
 #
-def update( bmrbid, verbose = False ) :
+def update( bmrbid, verbose = False, quick = False ) :
     """read and udpate one BMRB entry"""
     if verbose : sys.stdout.write( "update( %s )\n" % (bmrbid,) )
     global ENTRYDIR   # = "/share/subedit/entries/bmr%s/clean"
@@ -228,7 +253,7 @@ def update( bmrbid, verbose = False ) :
                 sys.stdout.write( "no STAR file %s for %s\n" % (infile,bmrbid,) )
             return { "err" : "File not found" }
 
-    data = StarParser.parse_file( filename = infile, verbose = verbose )
+    data = StarParser.parse_file( filename = infile, verbose = verbose, quick = quick )
     if data is None :
         sys.stderr.write( "Errors parsing %s\n" % (infile,) )
         return { "err" : "Parse error" }
@@ -328,7 +353,7 @@ def update( bmrbid, verbose = False ) :
                 continue
 
             oldstr = ""
-            with open( outfile, "rU" ) as f :
+            with open( outfile, _READ ) as f :
                 oldstr = f.read()
 
             if oldstr == newstr :
@@ -355,6 +380,9 @@ def main() :
     ap = argparse.ArgumentParser( description = "read residue sequence(s) from NMR-STAR file" )
     ap.add_argument( "-v", "--verbose", help = "print lots of messages to stdout", dest = "verbose",
         action = "store_true", default = False )
+    ap.add_argument( "-q", "--quick", help = "only parse the entity saveframes: faster, but syntax "
+        + "errors elsewhere in the entry are not reported and don't stop its sequence update",
+        dest = "quick", action = "store_true", default = False )
 
     args = ap.parse_args( sys.argv[1:] )
 
@@ -370,7 +398,7 @@ def main() :
             continue
         bmrbid = m.group( 1 )
         total += 1
-        ret = update( bmrbid, verbose = args.verbose )
+        ret = update( bmrbid, verbose = args.verbose, quick = args.quick )
         if "err" in ret.keys() : 
             if ret["err"] != "File not found" : # probably unreleased
                 errors += 1
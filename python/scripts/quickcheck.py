@@ -12,10 +12,20 @@ import collections
 _UP = os.path.join( os.path.split( __file__ )[0], ".." )
 sys.path.append( os.path.realpath( _UP ) )
 import sas
+import sas.archive
 
 if (sys.version_info[0] == 2) and (sys.version_info[1] > 6) :
     sys.path = list( collections.OrderedDict.fromkeys( sys.path ) )
 
+try :
+    from collections.abc import Iterable
+except ImportError :
+    from collections import Iterable
+
+# universal newlines: python 3 text mode does that, and has no "U" mode (3.11)
+#
+_READ = (sys.version_info[0] < 3) and "rU" or "r"
+
 #
 #
 class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
@@ -32,16 +42,22 @@ class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
     @classmethod
     def check_nmr_star( cls, fp, dictionary = None, verbose = False ) :
         chk = cls( dictionary )
-        lex =  sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        lex =  sas.StarLexer( fp, verbose = verbose )
         p = sas.SansParser.parse( lexer = lex, content_handler = chk, error_handler = chk, verbose = verbose )
         return (not chk._errs)
 
     @classmethod
     def check_nmr_star_file( cls, filename, dictionary = None, verbose = False ) :
-        rc = False
-        with open( filename, "rU" ) as fp :
-            rc = cls.check_nmr_star( fp, dictionary, verbose )
-        return rc
+        return cls.check_nmr_star( filename, dictionary, verbose )
+
+    # generator: (member name, passed) for NMR-STAR files in tar or zip archive
+    #
+    @classmethod
+    def check_nmr_star_archive( cls, archive, dictionary = None, verbose = False, pattern = "*.str*" ) :
+        for (name, chk) in sas.archive.parse_members( archive, sas.SansParser,
+                lambda name : (lambda chk : (chk, chk))( cls( dictionary ) ),
+                pattern = pattern, verbose = verbose ) :
+            yield (name, (not chk._errs))
 
 # TODO: add methods to check mmCIF and DDL if anyone ever needs them
 #
@@ -50,7 +66,7 @@ class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
     #
     def __init__( self, dictionary ) :
         if dictionary is not None :
-            assert isinstance( dictionary, collections.Iterable )
+            assert isinstance( dictionary, Iterable )
         self._dict = dictionary
         self._errs = False
 
@@ -107,7 +123,7 @@ if __name__ == "__main__" :
 
     taglist = set()
     if dictfile is not None :
-        with open( dictfile, "rU" ) as f :
+        with open( dictfile, _READ ) as f :
             for line in f :
                 tag = line.strip()
                 if (tag[0] == "'") and (tag[-1] == "'" ) :
@@ -120,7 +136,13 @@ if __name__ == "__main__" :
         taglist = None
 
     if infile is None :
-        rc = QuickCheck.check_nmr_star( fp = sys.stdin, dictionary = taglist, verbose = False ) # True )
+        rc = QuickCheck.check_nmr_star( fp = getattr( sys.stdin, "buffer", sys.stdin ), dictionary = taglist, verbose = False ) # True )
+    elif sas.archive.is_archive( infile ) :
+        rc = True
+        for (name, ok) in QuickCheck.check_nmr_star_archive( archive = infile, dictionary = taglist ) :
+            if not ok :
+                sys.stderr.write( "%s:%s check failed!\n" % (infile, name) )
+                rc = False
     else :
         rc = QuickCheck.check_nmr_star_file( filename = infile, dictionary = taglist, verbose = False ) # = True )
     if not rc :
@@ -0,0 +1,8 @@
+#
+# tests run from the source tree: the package is in python/, test inputs in testfiles/
+#
+import os
+import sys
+
+HERE = os.path.split( os.path.realpath( __file__ ) )[0]
+sys.path.insert( 0, os.path.join( HERE, "..", "python" ) )
@@ -0,0 +1,37 @@
+#
+# handlers that record callbacks for the tests
+#
+import os
+
+import sas
+
+TESTFILES = os.path.realpath( os.path.join( os.path.split( __file__ )[0], "..", "testfiles" ) )
+
+def sample( name ) :
+    return os.path.join( TESTFILES, name )
+
+# every callback of every interface is appended to ``log`` as (name, {args}); errors are
+# ignored (``error()`` returns ``stop``) so parsing goes on past them
+#
+_CALLBACKS = ("startData", "endData", "startSaveframe", "endSaveframe", "startLoop", "endLoop",
+    "comment", "data", "tag", "value", "startValue", "endValue", "characters", "loopHeader", "rows",
+    "fatalError", "error", "warning")
+
+def recorder( base, stop = False, batch = None ) :
+    """handler class: ``base`` content handler interface and ``sas.ErrorHandler``"""
+    def callback( name ) :
+        def f( self, **kwargs ) :
+            if name == "rows" :
+                kwargs["rows"] = [list( r ) for r in kwargs["rows"]]
+            self.log.append( (name, dict( (k, (v if isinstance( v, (str, list, bool, type( None )) ) else int( v )))
+                for (k, v) in kwargs.items() )) )
+            return stop if name == "error" else False
+        f.__name__ = name
+        return f
+    attrs = dict( (name, callback( name )) for name in _CALLBACKS )
+    def __init__( self ) :
+        self.log = []
+    attrs["__init__"] = __init__
+    if batch is not None :
+        attrs["batch"] = batch
+    return type( "Recorder", (base, sas.ErrorHandler), attrs )
@@ -0,0 +1,106 @@
+#
+# parsing members of tar and zip archives
+#
+import gzip
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import sas
+import sas.archive
+
+from helpers import recorder, sample
+
+FILES = ("loop1.str", "warning.str", "bmr25679_3.str", "warning.cif")
+
+class _Stream( object ) :
+    """file that can only be read: a pipe"""
+    def __init__( self, fp ) :
+        self._fp = fp
+    def read( self, size = -1 ) :
+        return self._fp.read( size )
+    def seekable( self ) :
+        return False
+
+def _tar( tmp_path ) :
+    """tar.gz of ``FILES`` in a directory, and bmr25679_3.str gzipped again"""
+    path = str( tmp_path / "entries.tar.gz" )
+    with tarfile.open( path, "w:gz" ) as tar :
+        for name in FILES :
+            tar.add( sample( name ), arcname = "entries/" + name )
+        buf = io.BytesIO()
+        with gzip.GzipFile( fileobj = buf, mode = "wb" ) as gz, open( sample( "bmr25679_3.str" ), "rb" ) as f :
+            gz.write( f.read() )
+        data = buf.getvalue()
+        info = tarfile.TarInfo( "entries/nested.str.gz" )
+        info.size = len( data )
+        tar.addfile( info, io.BytesIO( data ) )
+    return path
+
+def _zip( tmp_path ) :
+    path = str( tmp_path / "entries.zip" )
+    with zipfile.ZipFile( path, "w", zipfile.ZIP_DEFLATED ) as z :
+        z.writestr( "entries/", b"" )
+        for name in FILES :
+            z.write( sample( name ), "entries/" + name )
+    return path
+
+def _direct( name ) :
+    h = recorder( sas.ContentHandler )()
+    sas.SansParser.parse( sas.StarLexer( fp = sample( name ), engine = "regex" ), h, h )
+    return h.log
+
+def _parse( archive, pattern = None ) :
+    return [(name, h.log) for (name, h) in sas.archive.parse_members( archive, sas.SansParser,
+        lambda name : (lambda h : (h, h))( recorder( sas.ContentHandler )() ), pattern = pattern,
+        engine = "regex" )]
+
+def _open( kind, tmp_path ) :
+    """archive as parse_members() takes it: file name, seekable file, or stream"""
+    if kind == "zip" :
+        return _zip( tmp_path )
+    path = _tar( tmp_path )
+    if kind == "tar" :
+        return path
+    if kind == "tarfile" :
+        return open( path, "rb" )
+    return _Stream( open( path, "rb" ) )
+
+@pytest.mark.parametrize( "kind", ("tar", "tarfile", "tarstream", "zip") )
+def test_members( kind, tmp_path ) :
+    """every file in the archive, parsed as if it was read directly"""
+    parsed = _parse( _open( kind, tmp_path ) )
+    names = ["entries/" + name for name in FILES]
+    if kind != "zip" :
+        names.append( "entries/nested.str.gz" )
+    assert [name for (name, log) in parsed] == names
+    for (name, log) in parsed :
+        base = name.split( "/" )[-1]
+        assert log == _direct( (base == "nested.str.gz") and "bmr25679_3.str" or base ), name
+
+@pytest.mark.parametrize( "kind", ("tar", "tarstream", "zip") )
+def test_pattern( kind, tmp_path ) :
+    """``pattern`` selects the members"""
+    archive = _open( kind, tmp_path )
+    assert [name for (name, log) in _parse( archive, pattern = "*.cif" )] == ["entries/warning.cif"]
+    names = [name for (name, f) in sas.archive.members( _open( kind, tmp_path ), pattern = "*/loop*" )]
+    assert names == ["entries/loop1.str"]
+
+def test_one_lexer( tmp_path, monkeypatch ) :
+    """one lexer reads all members, ``reset()`` for each"""
+    made = []
+    resets = []
+    class Lexer( sas.StarLexer ) :
+        def __init__( self, *args, **kwargs ) :
+            made.append( self )
+            super( Lexer, self ).__init__( *args, **kwargs )
+        def reset( self, fp = None ) :
+            resets.append( (self, fp) )
+            return super( Lexer, self ).reset( fp )
+    monkeypatch.setattr( sas, "StarLexer", Lexer )
+    parsed = _parse( _tar( tmp_path ) )
+    assert len( made ) == 1
+    assert all( lexer is made[0] for (lexer, fp) in resets )
+    assert len( [fp for (lexer, fp) in resets if fp is not None] ) == len( parsed )
@@ -0,0 +1,97 @@
+#
+# ColumnHandler: loops as columns, columns of numbers converted
+#
+import array
+import io
+import math
+
+import pytest
+
+import sas
+from sas.columns import ColumnHandler
+
+from helpers import sample
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+STORAGE = ("array", "list") + ((numpy is not None) and ("numpy",) or ())
+
+LOOP = u"""data_columns
+loop_
+    _t.int _t.real _t.nulls _t.mixed _t.nan _t.under _t.big _t.esd _t.digits
+    1   1.5    .  1  nan 1_0  123456789012345678901234  1.5(2)  ١
+    -2  .5e3   ?  a  inf 2    -123456789012345678901234 2.25(3) 2
+    +3  -4.    .  .  1   3    1                         3       3
+"""
+
+class Quiet( sas.ErrorHandler ) :
+    def error( self, line, msg ) :
+        return False
+    def warning( self, line, msg ) :
+        return False
+
+def _loop( storage, text = LOOP, convert = True ) :
+    h = ColumnHandler( storage = storage, convert = convert )
+    sas.CifParser.parse( sas.StarLexer( fp = io.StringIO( text ), engine = "regex" ), h, Quiet() )
+    assert len( h.loops ) == 1
+    return h.loops[0]
+
+def _values( column ) :
+    return [(None if (isinstance( v, float ) and math.isnan( v )) else v) for v in list( column )]
+
+@pytest.mark.parametrize( "storage", STORAGE )
+def test_numbers( storage ) :
+    """integers and decimals are converted, nulls are NaN"""
+    loop = _loop( storage )
+    assert _values( loop["_t.int"] ) == [1, -2, 3]
+    assert _values( loop["_t.real"] ) == [1.5, 500.0, -4.0]
+    assert isinstance( loop["_t.real"][0], float )
+    assert loop["_t.nulls"] == [".", "?", "."]
+    assert loop["_t.mixed"] == ["1", "a", "."]
+    if storage == "numpy" :
+        assert loop["_t.int"].dtype == numpy.int64
+        assert loop["_t.real"].dtype == numpy.float64
+    elif storage == "array" :
+        assert isinstance( loop["_t.int"], array.array )
+    else :
+        assert isinstance( loop["_t.int"], list )
+
+@pytest.mark.parametrize( "storage", STORAGE )
+def test_not_numbers( storage ) :
+    """what python or NumPy would take for a number but STAR doesn't stays a string"""
+    loop = _loop( storage )
+    assert loop["_t.nan"] == ["nan", "inf", "1"]
+    assert loop["_t.under"] == ["1_0", "2", "3"]
+    assert loop["_t.esd"] == ["1.5(2)", "2.25(3)", "3"]
+    assert loop["_t.digits"] == [u"١", "2", "3"]
+
+@pytest.mark.parametrize( "storage", STORAGE )
+def test_big_integers( storage ) :
+    """integers over 64 bits are exact python ints in every storage"""
+    loop = _loop( storage )
+    column = loop["_t.big"]
+    assert isinstance( column, list )
+    assert column == [123456789012345678901234, -123456789012345678901234, 1]
+
+@pytest.mark.parametrize( "storage", STORAGE )
+def test_convert_subset( storage ) :
+    """only the columns in ``convert`` are converted"""
+    loop = _loop( storage, convert = ("_t.real",) )
+    assert loop["_t.int"] == ["1", "-2", "+3"]
+    assert _values( loop["_t.real"] ) == [1.5, 500.0, -4.0]
+    loop = _loop( storage, convert = False )
+    assert loop["_t.real"] == ["1.5", ".5e3", "-4."]
+
+@pytest.mark.parametrize( "storage", STORAGE )
+def test_short_last_row( storage ) :
+    """the short last row of a loop with count error is padded with NaN and None"""
+    h = ColumnHandler( storage = storage )
+    sas.SansParser.parse( sas.StarLexer( fp = sample( "loop1.str" ), engine = "regex" ), h, Quiet() )
+    loop = h.loops[0]
+    assert len( loop ) == 5
+    assert _values( loop["_Entry_author.Entry_ID"] ) == [15000, 3, 4, 5, None]
+    if storage == "numpy" :
+        assert loop["_Entry_author.Entry_ID"].dtype == numpy.float64
@@ -0,0 +1,73 @@
+#
+# gzip, bzip2 and xz input: same callbacks as the plain file
+#
+import bz2
+import gzip
+import io
+
+import pytest
+
+import sas
+
+from helpers import recorder, sample
+
+try :
+    import lzma
+except ImportError :
+    lzma = None
+
+NAME = "bmr25679_3.str"
+ENGINES = ("ply", "regex")
+
+def _gzip( data ) :
+    buf = io.BytesIO()
+    with gzip.GzipFile( fileobj = buf, mode = "wb" ) as f :
+        f.write( data )
+    return buf.getvalue()
+
+COMPRESS = {"gz" : _gzip, "bz2" : bz2.compress}
+if lzma is not None :
+    COMPRESS["xz"] = lzma.compress
+
+class _Raw( io.RawIOBase ) :
+    """pipe-like raw stream: no seek, no peek"""
+    def __init__( self, data ) :
+        self._data = io.BytesIO( data )
+    def readable( self ) :
+        return True
+    def readinto( self, b ) :
+        data = self._data.read( len( b ) )
+        b[:len( data )] = data
+        return len( data )
+
+def _data( name ) :
+    with open( sample( name ), "rb" ) as f :
+        return f.read()
+
+def _parse( fp, engine ) :
+    h = recorder( sas.ContentHandler )()
+    sas.SansParser.parse( sas.StarLexer( fp = fp, engine = engine, bufsize = 4096 ), h, h )
+    return h.log
+
+@pytest.mark.parametrize( "engine", ENGINES )
+@pytest.mark.parametrize( "kind", sorted( COMPRESS ) )
+def test_compressed( kind, engine, tmp_path ) :
+    """compressed file by name, open file, and stream that can't seek"""
+    expected = _parse( sample( NAME ), engine )
+    data = COMPRESS[kind]( _data( NAME ) )
+    path = str( tmp_path / (NAME + "." + kind) )
+    with open( path, "wb" ) as f :
+        f.write( data )
+    assert _parse( path, engine ) == expected
+    with open( path, "rb" ) as f :
+        assert _parse( f, engine ) == expected
+    assert _parse( io.BufferedReader( _Raw( data ) ), engine ) == expected
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_plain_streams( engine ) :
+    """the check for compression doesn't eat the start of plain input, however it's read"""
+    expected = _parse( sample( NAME ), engine )
+    data = _data( NAME )
+    assert _parse( io.BytesIO( data ), engine ) == expected
+    assert _parse( io.BufferedReader( _Raw( data ) ), engine ) == expected
+    assert _parse( _Raw( data ), engine ) == expected
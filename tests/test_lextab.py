@@ -0,0 +1,62 @@
+#
+# PLY lexer tables saved in the user's cache directory
+#
+import os
+import sys
+
+import ply.lex
+import pytest
+
+import sas
+import sas.lexer
+
+def _built() :
+    """PLY lexer built from the rules, as ``_ply_lexer()`` makes it when there's no table"""
+    return ply.lex.lex( module = object.__new__( sas.StarLexer ), errorlog = ply.lex.NullLogger(),
+        reflags = sas.lexer._REFLAGS )
+
+@pytest.fixture
+def cache( tmp_path, monkeypatch ) :
+    monkeypatch.setenv( "XDG_CACHE_HOME", str( tmp_path ) )
+    return os.path.join( str( tmp_path ), "sas" )
+
+def test_cache_dir( cache ) :
+    """the table goes to the cache directory, not the package, and can be read back"""
+    name = sas.lexer._lextab_name( sas.StarLexer )
+    sas.lexer._write_lextab( _built(), name )
+    assert os.listdir( cache ) == [name + ".py"]
+    tab = sas.lexer._read_lextab( name )
+    assert tab._lextokens == _built().lextokens
+    assert sas.lexer._read_lextab( "_lextab_0123456789abcdef" ) is None
+
+def test_stale_tables_removed( cache ) :
+    """writing the table removes the tables of other rules"""
+    os.makedirs( cache )
+    stale = os.path.join( cache, "_lextab_0123456789abcdef.py" )
+    with open( stale, "w" ) as f :
+        f.write( "# stale\n" )
+    name = sas.lexer._lextab_name( sas.StarLexer )
+    sas.lexer._write_lextab( _built(), name )
+    assert os.listdir( cache ) == [name + ".py"]
+
+def test_write_error_said_once( cache, monkeypatch, capsys ) :
+    """a table that can't be saved is reported on stderr, once"""
+    def fail( *args ) :
+        raise OSError( "read-only" )
+    monkeypatch.setattr( sas.lexer, "_replace", fail )
+    monkeypatch.setattr( sas.lexer, "_lextab_warned", False )
+    for i in range( 2 ) :
+        sas.lexer._write_lextab( _built(), "_lextab_0123456789abcdef" )
+    assert capsys.readouterr().err.count( "read-only" ) == 1
+    assert os.listdir( cache ) == []
+
+def test_package_module() :
+    """dialect parsers are imported on first use, the package is one module"""
+    assert sys.modules["sas"] is sas
+    assert sas.CifParser is sas.mmcif.CifParser
+    with pytest.raises( AttributeError ) :
+        sas.NoSuchParser
+    if sys.version_info >= (3, 7) :
+        import importlib
+        assert importlib.reload( sas ) is sas
+        assert not hasattr( sas, "_package" )
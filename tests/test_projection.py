@@ -0,0 +1,39 @@
+#
+# parsing with ``wanted`` tags: same callbacks as a full parse, less the unwanted ones
+#
+import sas
+
+from helpers import recorder, sample
+
+LEXERS = ({"engine" : "ply"}, {"engine" : "regex"}, {"engine" : "regex", "lazylines" : True},
+    {"engine" : "regex", "bulk" : True, "whitespace" : False})
+
+def _parse( parser, name, wanted, **kwargs ) :
+    h = recorder( sas.ContentHandler )()
+    parser.parse( sas.StarLexer( fp = sample( name ), **kwargs ), h, h, wanted = wanted )
+    return h.log
+
+def test_end_line() :
+    """``endData()`` gets the last line of input when the end of it is skipped"""
+    for (parser, name, wanted) in ((sas.CifParser, "3fke.cif", ("_struct",)),
+            (sas.SansParser, "bmr18587_3.str", ("entity",)),
+            (sas.SansParser, "bmr18587_3.str", ("_Entry.ID",))) :
+        for kwargs in LEXERS :
+            full = [e for e in _parse( parser, name, None, **kwargs ) if e[0] == "endData"]
+            part = [e for e in _parse( parser, name, wanted, **kwargs ) if e[0] == "endData"]
+            assert part == full, (name, wanted, kwargs)
+
+def test_wanted_items() :
+    """the data items passed on are the full parse's items with a wanted tag category"""
+    for kwargs in LEXERS :
+        full = _parse( sas.CifParser, "3fke.cif", None, **kwargs )
+        part = _parse( sas.CifParser, "3fke.cif", ("_struct", "_atom_site"), **kwargs )
+        assert [e for e in part if e[0] == "data"] == [e for e in full if (e[0] == "data")
+            and (e[1]["tag"].split( ".", 1 )[0] in ("_struct", "_atom_site"))], kwargs
+
+def test_skipped_errors() :
+    """errors in skipped input are not reported"""
+    full = _parse( sas.SansParser, "loop1.str", None, engine = "regex" )
+    assert [e for e in full if e[0] == "error"]
+    part = _parse( sas.SansParser, "loop1.str", ("nothing",), engine = "regex" )
+    assert [e for e in part if e[0] == "error"] == []
@@ -0,0 +1,77 @@
+#
+# StarLexer.peek() and push_back()
+#
+import pytest
+
+import sas
+
+ENGINES = ("ply", "regex")
+
+TEXT = "data_x\n_a 1\n_b 'two'\n_c 3\n"
+
+# newline in a quoted value is a lexer error after the five tokens before it
+#
+BAD = "data_x\n_a 'open\n_b 1\n"
+
+def _lexer( engine, text = TEXT ) :
+    lexer = sas.StarLexer( engine = engine, whitespace = False )
+    lexer.send( text )
+    return lexer
+
+def _values( tokens ) :
+    return [(t.type, t.value) for t in tokens]
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_peek( engine ) :
+    """``peek()`` returns the same token until ``next()`` takes it"""
+    lexer = _lexer( engine )
+    first = lexer.peek()
+    assert lexer.peek() is first
+    assert lexer.peek() is first
+    assert next( lexer ) is first
+    assert _values( [lexer.peek()] ) == [("TAGNAME", "_a")]
+    rest = list( lexer )
+    assert _values( rest )[0] == ("TAGNAME", "_a")
+    assert lexer.peek() is None
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_push_back_order( engine ) :
+    """tokens pushed back come out last in, first out, then the rest of the input"""
+    expected = _values( _lexer( engine ) )
+    lexer = _lexer( engine )
+    taken = [next( lexer ) for i in range( 4 )]
+    for token in taken :
+        lexer.push_back( token )
+    assert _values( [next( lexer ) for i in range( 4 )] ) == _values( reversed( taken ) )
+    for token in reversed( taken ) :
+        lexer.push_back( token )
+    assert _values( lexer ) == expected
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_push_back_batch( engine ) :
+    """tokens from ``tokens_batch()`` pushed back mix with ``next()`` and ``peek()``"""
+    expected = _values( _lexer( engine ) )
+    lexer = _lexer( engine )
+    batch = lexer.tokens_batch( 3 )
+    assert _values( batch ) == expected[:3]
+    lexer.push_back( batch[2] )
+    lexer.push_back( batch[1] )
+    assert lexer.peek() is batch[1]
+    assert next( lexer ) is batch[1]
+    lexer.push_back( batch[0] )
+    assert _values( lexer ) == [expected[0]] + expected[2:]
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_held_error( engine ) :
+    """a lexer error behind peeked and pushed back tokens comes after them"""
+    lexer = _lexer( engine, BAD )
+    batch = lexer.tokens_batch()
+    assert _values( batch ) == [("DATASTART", "x"), ("TAGNAME", "_a"), ("SINGLESTART", "'"),
+        ("CHARACTERS", "open")]
+    for token in reversed( batch ) :
+        lexer.push_back( token )
+    assert lexer.peek() is batch[0]
+    taken = [next( lexer ) for i in range( len( batch ) )]
+    assert taken == batch
+    with pytest.raises( sas.SasException ) :
+        lexer.peek()
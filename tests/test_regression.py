@@ -0,0 +1,96 @@
+#
+# every parser over every test file with every lexer option and input: same callbacks as the
+# default PLY lexer. That includes the error paths: loop1-5.str and warning.str/.cif
+#
+# ``semiblock`` makes one CHARACTERS token of a semicolon-delimited value, so what shows tokens
+# (``SasContentHandler.characters()``, "invalid token" errors) gets it in one piece: those runs
+# are compared to the regex engine with ``semiblock``, and that to PLY without them
+#
+import io
+import itertools
+import os
+
+import pytest
+
+import sas
+
+from helpers import TESTFILES, recorder, sample
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+PARSERS = (("SansParser", sas.ContentHandler), ("SansParser2", sas.ContentHandler2),
+    ("SasParser", sas.SasContentHandler), ("CifParser", sas.ContentHandler),
+    ("DdlParser", sas.ContentHandler))
+
+# breaker.str (2MB) takes minutes through all of these: set SAS_TEST_BIG to include it.
+# in files over SMALL only the file's own dialect parser gets the options, each alone and all
+# of them together, from a file name. other inputs and parsers get each engine's defaults
+#
+BIG = 1000000
+SMALL = 10000
+DIALECTS = {".str" : "SansParser", ".cif" : "CifParser"}
+FILES = sorted( name for name in os.listdir( TESTFILES )
+    if os.environ.get( "SAS_TEST_BIG" ) or (os.path.getsize( sample( name ) ) < BIG) )
+
+def _options() :
+    """ply with and without whitespace tokens, and every combination of regex engine options"""
+    yield {"engine" : "ply"}
+    yield {"engine" : "ply", "whitespace" : False}
+    bulk = ({}, {"bulk" : True}) + (numpy is not None and ({"vectorize" : True},) or ())
+    for (values, semiblock, lazylines, whitespace) in itertools.product( bulk, (False, True),
+            (False, True), (True, False) ) :
+        rc = {"engine" : "regex", "semiblock" : semiblock, "lazylines" : lazylines,
+            "whitespace" : whitespace}
+        rc.update( values )
+        yield rc
+
+def _changed( options ) :
+    return len( [k for (k, v) in options.items() if (k != "engine") and (v != (k == "whitespace"))] )
+
+OPTIONS = list( _options() )
+FEW = [o for o in OPTIONS if (o["engine"] == "ply") or (_changed( o ) in (0, 1, 4))]
+DEFAULTS = ({"engine" : "ply"}, {"engine" : "regex"})
+
+# file name: memory-mapped bytes. streams are read in small buffers so values span them
+#
+INPUTS = {
+    "name"   : lambda name : sample( name ),
+    "text"   : lambda name : io.open( sample( name ), encoding = "utf-8" ),
+    "binary" : lambda name : io.open( sample( name ), "rb" )
+}
+
+def _parse( parser, base, name, source, options ) :
+    fp = INPUTS[source]( name )
+    try :
+        h = recorder( base )()
+        getattr( sas, parser ).parse( sas.StarLexer( fp = fp, bufsize = 1024, **options ), h, h )
+        return h.log
+    finally :
+        if source != "name" :
+            fp.close()
+
+def _values( log ) :
+    """``log`` without the callbacks that show tokens"""
+    return [e for e in log if e[0] not in ("characters", "error")]
+
+@pytest.mark.parametrize( "name", FILES )
+def test_lexer_options( name ) :
+    """callbacks don't depend on lexer engine, options, or input"""
+    small = os.path.getsize( sample( name ) ) < SMALL
+    dialect = DIALECTS.get( os.path.splitext( name )[1] )
+    for (parser, base) in PARSERS :
+        expected = _parse( parser, base, name, "name", {"engine" : "ply"} )
+        semiblock = _parse( parser, base, name, "name", {"engine" : "regex", "semiblock" : True} )
+        assert _values( semiblock ) == _values( expected ), parser
+        for source in sorted( INPUTS ) :
+            if small :
+                matrix = OPTIONS
+            else :
+                matrix = ((source == "name") and (parser == dialect)) and FEW or DEFAULTS
+            for options in matrix :
+                log = _parse( parser, base, name, source, options )
+                assert log == (options.get( "semiblock" ) and semiblock or expected), \
+                    (parser, source, options)
@@ -0,0 +1,61 @@
+#
+# StarLexer.reset() and cached PLY lexers: nothing is left over from the last input
+#
+import io
+
+import pytest
+
+import sas
+
+from helpers import recorder, sample
+
+ENGINES = ("ply", "regex")
+
+# warning.str ends inside a delimited value, loop1.str has a loop count error, 3fke.cif is
+# mmCIF: line numbers, lexer states and pushed back tokens are all left somewhere else
+#
+FIRST = ("warning.str", "loop1.str", "3fke.cif")
+SECOND = "bmr25679_3.str"
+
+def _parse( lexer ) :
+    h = recorder( sas.ContentHandler )()
+    sas.SansParser.parse( lexer, h, h )
+    return h.log
+
+@pytest.mark.parametrize( "engine", ENGINES )
+@pytest.mark.parametrize( "first", FIRST )
+def test_reset( engine, first ) :
+    """second file through a reset lexer parses the same as through a new one"""
+    expected = _parse( sas.StarLexer( fp = sample( SECOND ), engine = engine ) )
+    lexer = sas.StarLexer( fp = sample( first ), engine = engine )
+    _parse( lexer )
+    lexer.reset( sample( SECOND ) )
+    assert _parse( lexer ) == expected
+
+# stopped halfway: inside a value, with tokens peeked and the input stream still open
+#
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_reset_halfway( engine ) :
+    """reset in the middle of the input"""
+    expected = _parse( sas.StarLexer( fp = sample( SECOND ), engine = engine ) )
+    with io.open( sample( "warning.str" ), "rb" ) as f, io.open( sample( SECOND ), "rb" ) as g :
+        lexer = sas.StarLexer( fp = f, engine = engine )
+        for token in lexer :
+            if token.type == "SEMISTART" :
+                break
+        lexer.peek()
+        lexer.push_back( token )
+        lexer.reset( g )
+        assert _parse( lexer ) == expected
+
+@pytest.mark.parametrize( "engine", ENGINES )
+def test_new_lexer( engine ) :
+    """a new lexer from the same cached one is not where the last one stopped"""
+    expected = _parse( sas.StarLexer( fp = sample( SECOND ), engine = engine ) )
+    lexer = sas.StarLexer( fp = sample( "warning.str" ), engine = engine )
+    for token in lexer :
+        if token.type == "SEMISTART" :
+            break
+    assert _parse( sas.StarLexer( fp = sample( SECOND ), engine = engine ) ) == expected
+    _parse( lexer )
+    assert _parse( sas.StarLexer( fp = sample( SECOND ), engine = engine ) ) == expected
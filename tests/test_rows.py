@@ -0,0 +1,34 @@
+#
+# RowContentHandler: loop values in rows
+#
+import sas
+
+from helpers import recorder, sample
+
+def _rows( log ) :
+    rows = []
+    for (name, args) in log :
+        if name == "rows" :
+            rows.extend( args["rows"] )
+    return rows
+
+def test_loop_count_error_rows_come_first() :
+    """short last row is passed on before the loop count error stops the parser"""
+    h = recorder( sas.RowContentHandler, stop = True )()
+    sas.SansParser.parse( sas.StarLexer( fp = sample( "loop1.str" ), engine = "regex" ), h, h )
+    rows = _rows( h.log )
+    assert [len( r ) for r in rows] == [7, 7, 7, 7, 6]
+    names = [e[0] for e in h.log]
+    assert names.index( "rows" ) < names.index( "error" )
+
+def test_rows_match_data() :
+    """same values as ``ContentHandler`` in every batch size"""
+    for name in ("bmr18587_3.str", "loop1.str", "loop2.str", "loop3.str") :
+        h = recorder( sas.ContentHandler )()
+        sas.SansParser.parse( sas.StarLexer( fp = sample( name ), engine = "regex" ), h, h )
+        values = [a["val"] for (n, a) in h.log if (n == "data") and a["inloop"]]
+        for batch in (1, 3, 1024) :
+            r = recorder( sas.RowContentHandler, batch = batch )()
+            sas.SansParser.parse( sas.StarLexer( fp = sample( name ), engine = "regex" ), r, r )
+            assert [v for row in _rows( r.log ) for v in row] == values, (name, batch)
+            assert [e for e in r.log if e[0] == "error"] == [e for e in h.log if e[0] == "error"], (name, batch)
@@ -0,0 +1,60 @@
+#
+# StarLexer.send(): input in chunks cut anywhere
+#
+import io
+
+import pytest
+
+import sas
+
+from helpers import recorder
+
+# CRLF line ends, every kind of quoting, and a last line with no newline for flush()
+#
+TEXT = (b"data_send\r\n\r\nsave_one\r\n"
+    b"   _Tag.A  'single quoted value'\r\n"
+    b"   _Tag.B  \"double quoted\"\r\n"
+    b"   _Tag.C  '''triple\r\nquoted'''\r\n"
+    b"   _Tag.D\r\n;\r\nsemicolon line one\r\nline two\r\n;\r\n"
+    b"   loop_\r\n      _L.X _L.Y\r\n      1 'a b'\r\n      2 \"\"\"c\r\nd\"\"\"\r\n   stop_\r\n"
+    b"save_")
+
+def _sizes( n ) :
+    return [n] * (len( TEXT ) // n + 1)
+
+# cut inside each value and between CR and LF
+#
+def _cuts() :
+    cuts = [TEXT.index( b"quoted value" ), TEXT.index( b"uble quoted" ), TEXT.index( b"iple" ),
+        TEXT.index( b"\r\nquoted" ) + 1, TEXT.index( b"colon line" ), TEXT.index( b"two" ),
+        TEXT.index( b"\"\"\"c" ) + 2, len( TEXT ) - 2]
+    return [b - a for (a, b) in zip( [0] + cuts, cuts + [len( TEXT )] )]
+
+CHUNKS = [_sizes( n ) for n in (1, 2, 7, 100, 4096)] + [_cuts()]
+
+def _parse( lexer ) :
+    h = recorder( sas.ContentHandler )()
+    sas.SansParser.parse( lexer, h, h )
+    return h.log
+
+@pytest.mark.parametrize( "engine", ("ply", "regex") )
+@pytest.mark.parametrize( "sizes", CHUNKS, ids = ["1", "2", "7", "100", "4096", "cuts"] )
+def test_chunks( engine, sizes ) :
+    """tokens read after each ``send()`` and the final ``flush()`` parse the same as the whole
+    input: they are pushed back and parsed from a lexer with no input"""
+    expected = _parse( sas.StarLexer( fp = io.BytesIO( TEXT ), engine = engine ) )
+    lexer = sas.StarLexer( engine = engine )
+    tokens = []
+    pos = 0
+    for size in sizes :
+        lexer.send( TEXT[pos:pos + size] )
+        pos += size
+        tokens.extend( lexer )
+    assert pos >= len( TEXT )
+    lexer.flush()
+    tokens.extend( lexer )
+    assert tokens[-1].value == "save_"
+    replay = sas.StarLexer( engine = engine )
+    for token in reversed( tokens ) :
+        replay.push_back( token )
+    assert _parse( replay ) == expected
@@ -0,0 +1,77 @@
+#
+# whitespace is ASCII: same tokens from str and bytes input, and from both engines
+#
+import io
+import itertools
+import os
+
+import pytest
+
+import sas
+import sas.scanner
+
+from helpers import recorder
+
+# loop rows are wider than ``sas.scanner._BULK``: bulk looks at them
+#
+TEXT = (u"data_x\nsave_a\n _A.b v1\n _A.c  x y\n loop_\n _L.a _L.b\n 1 2 3\x1c4 " + u"v" * 48 + u"\n "
+    + u" ".join( str( i ) for i in range( 24 ) ) + u"\n stop_\nsave_\n")
+
+OPTIONS = ({ "engine" : "ply" }, { "engine" : "regex" }, { "engine" : "regex", "bulk" : True },
+    { "engine" : "regex", "bulk" : True, "whitespace" : False },
+    { "engine" : "regex", "lazylines" : True }, { "engine" : "regex", "lazylines" : True, "whitespace" : False })
+
+def _tokens( fp, **kwargs ) :
+    return [(t.type, t.value, int( t.lineno )) for t in sas.StarLexer( fp = fp, **kwargs )
+        if t.type not in ("NL", "SPACE")]
+
+@pytest.fixture
+def infile( tmp_path ) :
+    name = os.path.join( str( tmp_path ), "space.str" )
+    with io.open( name, "w", encoding = "utf-8" ) as f :
+        f.write( TEXT )
+    return name
+
+def test_str_and_bytes_tokens( infile ) :
+    ref = _tokens( io.open( infile, encoding = "utf-8" ), engine = "ply" )
+    assert ("TAGNAME", u"_A.b v1", 3) in ref
+    for opts in OPTIONS :
+        assert _tokens( io.open( infile, encoding = "utf-8" ), **opts ) == ref, opts
+        assert _tokens( infile, **opts ) == ref, opts
+        assert _tokens( io.open( infile, "rb" ), **opts ) == ref, opts
+
+# short loops are split a line at a time, long ones by numpy
+#
+@pytest.mark.parametrize( "rows", (1, 2 * sas.scanner._VECTOR_LINES) )
+def test_vectorized( tmp_path, rows ) :
+    pytest.importorskip( "numpy" )
+    infile = os.path.join( str( tmp_path ), "space.str" )
+    with io.open( infile, "w", encoding = "utf-8" ) as f :
+        f.write( TEXT.replace( u" stop_", u" 5 6\n" * rows + u" stop_" ) )
+    ref = _tokens( infile, engine = "ply" )
+    assert _tokens( infile, engine = "regex", vectorize = True ) == ref
+    assert _tokens( io.open( infile, encoding = "utf-8" ), engine = "regex", vectorize = True ) == ref
+
+def test_every_regex_mode( infile ) :
+    """no combination of options makes the input illegal or changes its tokens"""
+    ref = _tokens( infile, engine = "ply" )
+    for (bulk, semiblock, lazylines, whitespace) in itertools.product( (False, True), repeat = 4 ) :
+        opts = { "engine" : "regex", "bulk" : bulk, "semiblock" : semiblock, "lazylines" : lazylines,
+            "whitespace" : whitespace }
+        assert _tokens( infile, **opts ) == ref, opts
+        assert _tokens( io.open( infile, encoding = "utf-8" ), **opts ) == ref, opts
+
+# a context that ends at EOF before it has read a token: without whitespace tokens there are none
+#
+EOF_LINES = ((u"data_d\n", "endData", 1), (u"data_d\n\n\n", "endData", 1),
+    (u"data_d\nsave_x\n", "fatalError", 2), (u"data_d\nsave_x\n loop_\n", "fatalError", 3))
+
+@pytest.mark.parametrize( "engine", ("ply", "regex") )
+def test_eof_line( engine ) :
+    """EOF line is the same with and without whitespace tokens"""
+    for (text, callback, line) in EOF_LINES :
+        for whitespace in (True, False) :
+            h = recorder( sas.ContentHandler )()
+            sas.SansParser.parse( sas.StarLexer( fp = io.StringIO( text ), engine = engine,
+                whitespace = whitespace ), h, h )
+            assert [a["line"] for (n, a) in h.log if n == callback] == [line], (text, whitespace)